@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+import weakref
+import zipfile
+
+from config import SPOOL_DIR
+import metrics
+
+
+# ------------------ SPOOLED FILES ------------------
+def spool_path(suffix):
+    """Reserve a new temp file in the spool directory and return its path."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=SPOOL_DIR)
+    os.close(fd)
+    return path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_stale(max_age=6 * 3600):
+    """Delete spooled files left behind by sessions that never closed cleanly."""
+    if not os.path.isdir(SPOOL_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(SPOOL_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            remove_file(entry.path)
+            removed += 1
+    return removed
+
+
+class ZipSpool:
+    """ZIP archive written entry by entry straight to a spool file on disk
+    (or to path, when given).
+
+    Card PDFs are already compressed, so entries are stored rather than
+    deflated again. Only one entry's read buffer is in memory at a time."""
+
+    def __init__(self, compression=zipfile.ZIP_STORED, path=None):
+        self.path = path or spool_path(".zip")
+        self.count = 0
+        self._zip = zipfile.ZipFile(self.path, "w", compression)
+
+    def add(self, path, arcname=None):
+        with metrics.timed("zip_add_seconds"):
+            self._zip.write(path, arcname or os.path.basename(path))
+        self.count += 1
+
+    def close(self):
+        self._zip.close()
+
+    def discard(self):
+        self.close()
+        remove_file(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+# ------------------ SESSION DOWNLOADS ------------------
+def _remove_all(paths):
+    for path in list(paths.values()):
+        remove_file(path)
+    paths.clear()
+
+
+class SessionSpool:
+    """Spooled artifacts owned by one browser session, keyed by purpose.
+
+    Replacing an artifact removes the previous file, and every file is removed
+    when the session state holding this object is garbage collected."""
+
+    def __init__(self):
+        self._paths = {}
+        self._names = {}
+        self._finalizer = weakref.finalize(self, _remove_all, self._paths)
+
+    def put(self, key, path, file_name=None):
+        old = self._paths.get(key)
+        if old and old != path:
+            remove_file(old)
+        self._paths[key] = path
+        self._names[key] = file_name or os.path.basename(path)
+
+    def get(self, key):
+        path = self._paths.get(key)
+        if path and os.path.exists(path):
+            return path
+        return None
+
+    def file_name(self, key):
+        return self._names.get(key)
+
+    def discard(self, key):
+        path = self._paths.pop(key, None)
+        self._names.pop(key, None)
+        if path:
+            remove_file(path)
+
+    def clear(self):
+        _remove_all(self._paths)
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,314 @@
+"""Benchmarks for the app's hot paths on synthetic schools.
+
+    python benchmark.py --sizes 500 5000 50000 --output bench.json
+    python benchmark.py --sizes 500 --compare bench.json
+
+Every case records wall time (best and median of --repeat runs), the Python
+allocation high-water mark of one extra traced run, and the process and
+child-process peak RSS so far. Results are written as JSON.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import PDF_WORKERS
+from storage import JournalStorage, JsonStorage, SqliteStorage
+from repository import StudentRepository
+from search import SearchIndex
+from cards import generate_pdf, generate_pdfs, ensure_pdf
+from imposition import impose_pdf
+from archives import ZipSpool
+from exports import EXPORT_FORMATS, export_bytes, write_export
+from importer import IMPORT_MODES, merge_import, read_chunks, stream_import
+from photos import normalize_photo
+from previews import card_preview
+from synthetic import make_photos, make_students, to_frame
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+GROUPS = ["storage", "search", "cards", "zip", "import", "export", "photos"]
+
+
+# ------------------ MEASUREMENT ------------------
+def _maxrss_kb(who):
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, KiB on Linux
+
+
+class Bench:
+    def __init__(self, repeat=3, memory=True):
+        self.repeat = repeat
+        self.memory = memory
+        self.results = []
+
+    def run(self, case, students, fn, setup=None, items=None, repeat=None, **tags):
+        """Time fn(setup()) and record the result; setup runs untimed before every call."""
+        times = []
+        for _ in range(repeat or self.repeat):
+            arg = setup() if setup else None
+            gc.collect()
+            start = time.perf_counter()
+            fn(arg)
+            times.append(time.perf_counter() - start)
+
+        peak_kb = None
+        if self.memory:
+            arg = setup() if setup else None
+            gc.collect()
+            tracemalloc.start()
+            fn(arg)
+            peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+        result = {
+            "case": case,
+            "students": students,
+            **tags,
+            "seconds": min(times),
+            "median_seconds": statistics.median(times),
+            "runs": len(times),
+            "items": items,
+            "ms_per_item": min(times) * 1000 / items if items else None,
+            "peak_python_kb": peak_kb,
+            "maxrss_kb": _maxrss_kb(resource.RUSAGE_SELF) if resource else None,
+            "children_maxrss_kb": _maxrss_kb(resource.RUSAGE_CHILDREN) if resource else None,
+        }
+        self.results.append(result)
+        per_item = f" ({result['ms_per_item']:.2f} ms/item)" if items else ""
+        memory = f", peak {peak_kb} KiB" if peak_kb is not None else ""
+        label = " ".join([case] + [f"{k}={v}" for k, v in tags.items()])
+        print(f"  {label:<46} {result['seconds']:9.4f} s{per_item}{memory}", flush=True)
+        return result
+
+
+# ------------------ CASES ------------------
+def bench_storage(bench, n, students, workdir):
+    json_store = JsonStorage(os.path.join(workdir, f"bench_{n}.json"))
+    sqlite_store = SqliteStorage(os.path.join(workdir, f"bench_{n}.db"))
+    journal_store = JournalStorage(os.path.join(workdir, f"bench_{n}_journal.json"), os.path.join(workdir, f"bench_{n}.journal"))
+    for backend, store in (("json", json_store), ("sqlite", sqlite_store), ("journal", journal_store)):
+        bench.run("save_data", n, lambda _: store.save_all(students), backend=backend)
+        bench.run("load_data", n, lambda _: store.load_all(), backend=backend)
+        repo = StudentRepository(store)
+        repo.load_all()
+        bench.run("load_data_cached", n, lambda _: repo.load_all(), backend=backend, repeat=max(bench.repeat, 20))
+        bench.run(
+            "update_one", n,
+            lambda _: repo.update(students[0]['id'], {'phone': "03001234567"}),
+            backend=backend
+        )
+
+def bench_search(bench, n, students):
+    bench.run("search_index_build", n, lambda _: SearchIndex(students))
+    index = SearchIndex(students)
+    queries = {
+        "name_prefix": {"name": "muh"},
+        "name_fuzzy": {"name": "Muhamad Kahn"},
+        "number": {"number": "GR1001"},
+        "class_and_name": {"class_name": "5", "name": "ali"},
+    }
+    for label, query in queries.items():
+        bench.run("search_query", n, lambda _: [index.search(**query) for _ in range(20)], items=20, query=label)
+    bench.run("class_list", n, lambda _: index.classes(), repeat=max(bench.repeat, 20))
+
+def bench_cards(bench, n, students, card_count, bulk_count, workers):
+    sample = students[:card_count]
+    bench.run(
+        "generate_pdf", n,
+        lambda _: [generate_pdf(s, s.get('photo_path')) for s in sample],
+        items=len(sample), repeat=1
+    )
+    bench.run(
+        "ensure_pdf_cached", n,
+        lambda _: [ensure_pdf(s, s.get('photo_path')) for s in sample],
+        items=len(sample)
+    )
+    bench.run(
+        "card_preview", n,
+        lambda _: [card_preview(s, s.get('photo_path')) for s in sample],
+        items=len(sample), repeat=1
+    )
+    bench.run(
+        "card_preview_cached", n,
+        lambda _: [card_preview(s, s.get('photo_path')) for s in sample],
+        items=len(sample)
+    )
+    bulk = students[:bulk_count]
+    bench.run(
+        "generate_pdfs_bulk", n,
+        lambda _: list(generate_pdfs(bulk, workers=workers, force=True)),
+        items=len(bulk), repeat=1, workers=workers
+    )
+    bench.run(
+        "impose_sheets", n,
+        lambda _: impose_pdf(bulk, os.path.join("pdfs", "bench_sheets.pdf")),
+        items=len(bulk), repeat=1
+    )
+
+def bench_zip(bench, n, students, bulk_count):
+    bulk = students[:bulk_count]
+    pdfs = [path for _, path, error, _ in generate_pdfs(bulk, workers=1) if error is None]
+
+    def build(_):
+        zip_file = ZipSpool()
+        for path in pdfs:
+            zip_file.add(path)
+        zip_file.discard()
+    bench.run("zip_build", n, build, items=len(pdfs))
+
+def bench_import(bench, n, students, workdir):
+    # Half the sheet overlaps existing roll numbers, half is new
+    incoming = make_students(n, seed=1, start_id=n // 2 + 1)
+    df = to_frame(incoming)
+    csv_path = os.path.join(workdir, f"import_{n}.csv")
+    df.to_csv(csv_path, index=False)
+
+    for mode in IMPORT_MODES:
+        bench.run("merge_import", n, lambda _: merge_import(students, df, mode), items=n, mode=mode)
+
+    db_path = os.path.join(workdir, f"import_{n}.db")
+    for mode in IMPORT_MODES:
+        def fresh_store():
+            store = StudentRepository(SqliteStorage(db_path))
+            store.save_all(students)
+            return store
+
+        def run(store):
+            with open(csv_path, "rb") as f:
+                stream_import(read_chunks(f, csv_path), store, mode, os.path.join(workdir, "rejects.csv"))
+        bench.run("stream_import", n, run, setup=fresh_store, items=n, mode=mode)
+
+def bench_export(bench, n, students, workdir):
+    for fmt in EXPORT_FORMATS:
+        bench.run("export", n, lambda _: write_export(students, BytesIO(), fmt), items=n, repeat=1, format=fmt)
+
+    # Import/Export page: built on the first click, then served from the per-version cache
+    store = StudentRepository(SqliteStorage(os.path.join(workdir, f"export_{n}.db")))
+    store.save_all(students)
+    bench.run("export_cached", n, lambda _: export_bytes(store, "xlsx"), format="xlsx")
+
+def bench_photos(bench, raw_photos):
+    def normalize(_):
+        for i, path in enumerate(raw_photos):
+            with Image.open(path) as img:
+                normalize_photo(img, f"BENCH-{i}")
+    bench.run("normalize_photo", len(raw_photos), normalize, items=len(raw_photos), repeat=1)
+
+
+# ------------------ RUNNER ------------------
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    key = lambda r: tuple(sorted((k, str(v)) for k, v in r.items() if k in ("case", "students", "backend", "mode", "query", "workers", "format")))
+    previous = {key(r): r for r in baseline}
+    print(f"\nCompared with {baseline_path} (ratio < 1 is faster):")
+    for result in results:
+        old = previous.get(key(result))
+        if old and old["seconds"]:
+            ratio = result["seconds"] / old["seconds"]
+            label = " ".join(f"{v}" for _, v in key(result))
+            print(f"  {label:<60} {ratio:6.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ID card manager on synthetic schools.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cards", type=int, default=50, help="cards rendered one by one per size")
+    parser.add_argument("--bulk-cards", type=int, default=300, help="cards rendered in bulk, zipped and imposed per size")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS)
+    parser.add_argument("--photos", type=int, default=20, help="distinct synthetic photos")
+    parser.add_argument("--photo-px", type=int, default=1200, help="width of the synthetic camera photos")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    cwd = os.getcwd()
+    bench = Bench(repeat=args.repeat, memory=not args.no_memory)
+    started = datetime.now().isoformat()
+
+    with tempfile.TemporaryDirectory(prefix="idcard_bench_") as workdir:
+        # The app resolves photos/, pdfs/ and assets/ against the working directory
+        os.chdir(workdir)
+        os.symlink(os.path.join(REPO_DIR, "assets"), "assets")
+
+        print(f"Synthetic photos: {args.photos} x {args.photo_px}px", flush=True)
+        raw_photos = make_photos(os.path.join(workdir, "raw_photos"), args.photos, args.photo_px, seed=args.seed)
+        if "photos" in args.groups:
+            bench_photos(bench, raw_photos)
+        photo_paths = []
+        for i, path in enumerate(raw_photos):
+            with Image.open(path) as img:
+                photo_paths.append(normalize_photo(img, f"SYN-{i}"))
+
+        for n in args.sizes:
+            print(f"\n{n} students", flush=True)
+            students = make_students(n, seed=args.seed, photo_paths=photo_paths)
+            if "storage" in args.groups:
+                bench_storage(bench, n, students, workdir)
+            if "search" in args.groups:
+                bench_search(bench, n, students)
+            if "cards" in args.groups:
+                bench_cards(bench, n, students, min(args.cards, n), min(args.bulk_cards, n), args.workers)
+            if "zip" in args.groups:
+                bench_zip(bench, n, students, min(args.bulk_cards, n))
+            if "import" in args.groups:
+                bench_import(bench, n, students, workdir)
+            if "export" in args.groups:
+                bench_export(bench, n, students, workdir)
+
+        os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "started": started,
+            "finished": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": bench.results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(bench.results)} results to {output}")
+
+    if baseline:
+        compare(bench.results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import copy
+import hashlib
+import json
+import os
+from datetime import datetime
+from functools import partial
+
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfdoc
+from reportlab.lib.colors import HexColor, white
+
+from config import ASSET_DIR, PDF_DIR, CARD_WIDTH, CARD_HEIGHT, PDF_WORKERS
+from pools import run_chunked
+from qrcodes import draw_qr, encode_payload
+import metrics
+
+
+FRONT_BG_PATH = os.path.join(ASSET_DIR, "1.jpeg")
+BACK_BG_PATH = os.path.join(ASSET_DIR, "2.jpeg")
+TEMPLATE_ASSETS = [FRONT_BG_PATH, BACK_BG_PATH]
+
+# Fields drawn on the card; anything else (created_at, photo_path, ...) does not change the PDF
+CARD_FIELDS = [
+    "name", "father_name", "class", "roll_no", "gr_number",
+    "date_of_birth", "date_of_issue", "date_of_expiry", "phone",
+]
+# Bump whenever the layout in generate_pdf changes so cached cards are re-rendered
+CARD_LAYOUT_VERSION = 2
+
+
+# ------------------ CONTENT HASHING ------------------
+_file_hashes = {}
+
+def file_hash(path):
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def card_hash(info, img_path):
+    payload = {
+        "layout": CARD_LAYOUT_VERSION,
+        "qr": encode_payload(info),
+        "fields": {field: str(info.get(field)) for field in CARD_FIELDS},
+        "photo": file_hash(img_path),
+        "assets": [file_hash(path) for path in TEMPLATE_ASSETS],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def pdf_path_for(info):
+    return os.path.join(PDF_DIR, f"{info['roll_no'].replace(' ', '_')}_card.pdf")
+
+def _hash_path(pdf_path):
+    return pdf_path + ".hash"
+
+def remove_pdf(info):
+    for path in (pdf_path_for(info), _hash_path(pdf_path_for(info))):
+        if os.path.exists(path):
+            os.remove(path)
+
+def remove_pdfs(students):
+    """Remove the cached cards of many students after one batch delete."""
+    for info in students:
+        remove_pdf(info)
+
+
+# ------------------ TEMPLATE ASSETS ------------------
+class TemplateAsset:
+    """Template image read and encoded once per process, then shared by every card.
+
+    Each canvas gets the pre-built image XObject registered under a fixed form
+    name, so a multi-page document embeds it once and references it per page."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = "tpl_" + "".join(ch if ch.isalnum() else "_" for ch in os.path.basename(path))
+        self._key = None
+        self._xobject = None
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._key:
+            with metrics.timed("template_decode_seconds", asset=os.path.basename(self.path)):
+                self._xobject = pdfdoc.PDFImageXObject(self.name, self.path)
+            self._key = key
+        return self._xobject
+
+    def draw(self, c, x, y, width, height):
+        xobject = self._load()
+        if xobject is None:
+            return False
+        if not c.hasForm(self.name):
+            # register a copy: ReportLab tags registered objects with their document
+            c._doc.addForm(self.name, copy.copy(xobject))
+        c.saveState()
+        c.translate(x, y)
+        c.scale(width, height)
+        c.doForm(self.name)
+        c.restoreState()
+        return True
+
+
+_template_assets = {}
+
+def template_asset(path):
+    if path not in _template_assets:
+        _template_assets[path] = TemplateAsset(path)
+    return _template_assets[path]
+
+
+# ------------------ CARD RENDERING ------------------
+def int_to_roman(num):
+    if not num or not str(num).isdigit():
+        return str(num)
+    num = int(num)
+    val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
+    syms = ["M", "CM", "D", "CD", "C", "XC", "L", "XL", "X", "IX", "V", "IV", "I"]
+    roman = ""
+    i = 0
+    while num > 0:
+        for _ in range(num // val[i]):
+            roman += syms[i]
+            num -= val[i]
+        i += 1
+    return roman
+
+def draw_front(c, info, img_path):
+    with metrics.timed("card_stage_seconds", stage="template"):
+        template_asset(FRONT_BG_PATH).draw(c, 0, 0, 189, 321)
+
+    with metrics.timed("card_stage_seconds", stage="text"):
+        c.setFillColor(HexColor("#231f55"))
+        c.setFont("Helvetica-Bold", 9)
+        c.drawCentredString(94.5, 140, info['name'].upper())
+        c.drawCentredString(94.5, 113, info['father_name'].upper())
+
+        c.setFillColor(white)
+        c.setFont("Helvetica-Bold", 9)
+        roman_class = int_to_roman(info['class'])
+        c.drawCentredString(90.5, 95, "Level" + "-" + roman_class)
+
+        c.setFillColor(HexColor("#231f55"))
+        c.setFont("Helvetica", 9)
+        c.drawString(65, 67, info['roll_no'])
+        c.drawString(65, 52, info['gr_number'])
+        c.drawString(65, 37, datetime.fromisoformat(info["date_of_birth"]).strftime("%d %B, %Y"))
+
+    # Draw photo if exists
+    if img_path and os.path.exists(img_path):
+        img_x = CARD_WIDTH - 149
+        img_y = CARD_HEIGHT - 161.5
+        img_size = 103
+
+        # Draw circular clipping path
+        c.saveState()
+        p = c.beginPath()
+        center_x = img_x + img_size / 2
+        center_y = img_y + img_size / 2
+        radius = img_size / 2
+
+        p.circle(center_x, center_y, radius)
+        c.clipPath(p, stroke=0, fill=0)
+
+        # Draw the image inside the circle
+        with metrics.timed("card_stage_seconds", stage="photo"):
+            c.drawImage(img_path, img_x, img_y, width=img_size, height=img_size, mask='auto')
+        c.restoreState()
+
+def draw_back(c, info):
+    with metrics.timed("card_stage_seconds", stage="template"):
+        template_asset(BACK_BG_PATH).draw(c, 0, 0, 189, 321)
+
+    # QR Code: compact payload, matrix cached per payload
+    with metrics.timed("card_stage_seconds", stage="qr"):
+        draw_qr(c, encode_payload(info), 50, 125, 80)
+
+    with metrics.timed("card_stage_seconds", stage="text"):
+        c.setFillColor(HexColor("#231f55"))
+        c.setFont("Helvetica-Bold", 8)
+        c.drawString(95, 104, datetime.fromisoformat(info["date_of_issue"]).strftime("%d %B, %Y"))
+        c.drawString(95, 93, datetime.fromisoformat(info["date_of_expiry"]).strftime("%d %B, %Y"))
+
+        c.setFillColor(white)
+        c.setFont("Helvetica-Bold", 8.5)
+        c.drawString(85.5, 62.5, info['phone'])
+
+@metrics.timed("card_render_seconds")
+def generate_pdf(info, img_path):
+    pdf_path = pdf_path_for(info)
+    os.makedirs(PDF_DIR, exist_ok=True)
+    c = canvas.Canvas(pdf_path, pagesize=(CARD_WIDTH, CARD_HEIGHT))
+
+    # FRONT SIDE
+    draw_front(c, info, img_path)
+    c.showPage()
+
+    # BACK SIDE
+    draw_back(c, info)
+
+    with metrics.timed("card_stage_seconds", stage="save"):
+        c.save()
+    with metrics.timed("card_stage_seconds", stage="hash"):
+        with open(_hash_path(pdf_path), "w") as f:
+            f.write(card_hash(info, img_path))
+    metrics.count("cards_total", result="rendered")
+    return pdf_path
+
+def ensure_pdf(info, img_path):
+    """Return (pdf_path, rendered); the card is only re-rendered when its content hash changed."""
+    pdf_path = pdf_path_for(info)
+    if os.path.exists(pdf_path) and os.path.exists(_hash_path(pdf_path)):
+        with open(_hash_path(pdf_path)) as f:
+            if f.read().strip() == card_hash(info, img_path):
+                metrics.count("cards_total", result="cached")
+                return pdf_path, False
+    return generate_pdf(info, img_path), True
+
+
+def card_pdf_bytes(info):
+    """Card PDF for a download, rendered on first request and served from pdfs/ afterwards."""
+    pdf_path, _ = ensure_pdf(info, info.get('photo_path'))
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+# ------------------ PARALLEL GENERATION ------------------
+def _render_chunk(students, force=False):
+    results = []
+    for student in students:
+        try:
+            if force:
+                pdf_path, rendered = generate_pdf(student, student.get('photo_path')), True
+            else:
+                pdf_path, rendered = ensure_pdf(student, student.get('photo_path'))
+            results.append((student, pdf_path, None, rendered))
+        except Exception as e:
+            results.append((student, None, str(e), False))
+    return results
+
+def _render_chunk_in_worker(students, force, collect_metrics):
+    # Worker processes keep their own registry; send this chunk's numbers back with the results
+    metrics.enable(collect_metrics)
+    metrics.reset()
+    results = _render_chunk(students, force)
+    return results, metrics.snapshot() if collect_metrics else None
+
+
+def generate_pdfs(students, workers=PDF_WORKERS, chunk_size=8, force=False):
+    """Render cards across a process pool, yielding (student, pdf_path, error, rendered) as they finish.
+
+    Cards whose cached PDF matches their content hash are not re-rendered unless force is set."""
+    students = list(students)
+    workers = max(1, min(workers or 1, len(students) or 1))
+    if workers == 1:
+        for student in students:
+            yield from _render_chunk([student], force)
+        return
+
+    chunks = [students[i:i + chunk_size] for i in range(0, len(students), chunk_size)]
+    render = partial(_render_chunk_in_worker, force=force, collect_metrics=metrics.enabled())
+    for chunk, result, error in run_chunked(render, chunks, workers):
+        if error is None:
+            results, worker_metrics = result
+        else:
+            results, worker_metrics = [(student, None, error, False) for student in chunk], None
+        if worker_metrics:
+            metrics.merge(worker_metrics)
+        yield from results
@@ -0,0 +1,222 @@
+"""Headless batch commands, e.g. for nightly cron jobs:
+
+    python cli.py import students.xlsx --mode upsert
+    python cli.py generate --class 5 --zip class5_cards.zip
+    python cli.py sheets print_sheets.pdf --page-size A4 --class 5
+    python cli.py export students.csv
+    python cli.py changes delta.csv --state transport.token
+    python cli.py photos photos.zip --report photo_report.csv
+
+Uses the same storage, card cache and settings (IDCARD_* variables) as the
+app, without starting Streamlit. Exits non-zero when any card or row failed.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from config import PDF_WORKERS, STORAGE_BACKEND
+from archives import ZipSpool
+from cards import generate_pdfs
+from core import (
+    export_changes, export_students, import_file, import_photos, open_store, select_students,
+    write_cards_zip, write_photo_report, write_print_sheets,
+)
+from exports import EXPORT_FORMATS, parse_since
+from imposition import PAGE_SIZES
+import metrics
+
+
+MODES = ["add", "replace", "upsert"]
+
+
+def _progress(quiet, label):
+    # One rewritten status line on a terminal, nothing when quiet or piped
+    if quiet or not sys.stderr.isatty():
+        return None
+    return lambda done, total: print(f"\r{label}: {done}/{total}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+def _select(store, args):
+    return select_students(store, class_name=args.class_name, name=args.name, number=args.number, roll_nos=args.roll)
+
+
+# ------------------ COMMANDS ------------------
+def cmd_import(store, args):
+    # importer loads pandas, so only this command pays for it
+    from importer import ADD_NEW, REPLACE_ALL, UPSERT
+
+    mode = {"add": ADD_NEW, "replace": REPLACE_ALL, "upsert": UPSERT}[args.mode]
+    file_name = os.path.basename(args.file)
+    report_path = args.rejects or f"rejected_rows_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    progress = _progress(args.quiet, "Importing (%)")
+    counts = import_file(
+        store, args.file, file_name, mode, report_path,
+        on_progress=(lambda fraction, counts: progress(round(fraction * 100), 100)) if progress else None
+    )
+    print(
+        f"Added {counts['added']} new students, updated {counts['updated']}, "
+        f"skipped {counts['skipped']} duplicates, rejected {counts['rejected']} invalid rows."
+    )
+    if counts['rejected']:
+        print(f"Rejected rows: {report_path}")
+        return 1
+    os.remove(report_path)
+    return 0
+
+def cmd_generate(store, args):
+    students = _select(store, args)
+    progress = _progress(args.quiet, "Cards")
+    if args.zip:
+        with ZipSpool(path=args.zip) as zipf:
+            success_count, rendered_count, errors = write_cards_zip(
+                students, zipf, workers=args.workers, force=args.force, on_progress=progress
+            )
+    else:
+        success_count, rendered_count, errors = 0, 0, []
+        for i, (student, _, error, rendered) in enumerate(generate_pdfs(students, workers=args.workers, force=args.force)):
+            if error is None:
+                success_count += 1
+                rendered_count += rendered
+            else:
+                errors.append(f"{student['name']}: {error}")
+            if progress:
+                progress(i + 1, len(students))
+
+    for error in errors:
+        print(f"error: {error}", file=sys.stderr)
+    print(
+        f"Generated {success_count} of {len(students)} ID cards "
+        f"({rendered_count} rendered, {success_count - rendered_count} reused)."
+        + (f" ZIP: {args.zip}" if args.zip else "")
+    )
+    return 1 if errors else 0
+
+def cmd_photos(store, args):
+    report = import_photos(store, args.zip, workers=args.workers, on_progress=_progress(args.quiet, "Photos"))
+    for name, error in report['errors']:
+        print(f"error: {name}: {error}", file=sys.stderr)
+    for name, reason in report['unmatched']:
+        print(f"unmatched: {name}: {reason}", file=sys.stderr)
+    print(
+        f"Imported {report['imported']} photos. {len(report['unmatched'])} files matched no student; "
+        f"{len(report['missing'])} students still have no photo."
+    )
+    if args.report:
+        write_photo_report(report, args.report)
+        print(f"Report: {args.report}")
+    return 1 if report['errors'] or report['unmatched'] else 0
+
+def cmd_sheets(store, args):
+    students = _select(store, args)
+    if not students:
+        print("No students selected.", file=sys.stderr)
+        return 1
+    progress = _progress(args.quiet, "Cards")
+    count = write_print_sheets(
+        students, args.output, page_size=args.page_size,
+        on_progress=(lambda done: progress(done, len(students))) if progress else None
+    )
+    print(f"Laid out {count} ID cards on print sheets: {args.output}")
+    return 0
+
+def cmd_export(store, args):
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    students = _select(store, args)
+    export_students(students, args.output, fmt)
+    print(f"Exported {len(students)} students to {args.output}")
+    return 0
+
+def cmd_changes(store, args):
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    since = args.since
+    if since is None and args.state and os.path.exists(args.state):
+        with open(args.state) as f:
+            since = f.read()
+    changes = export_changes(store, args.output, fmt, parse_since(since))
+    if changes["full"]:
+        print(f"Exported all {len(changes['students'])} students to {args.output} (full export: replace the previous copy)")
+    else:
+        print(
+            f"Exported {len(changes['students'])} added or changed and {len(changes['deleted'])} deleted "
+            f"students to {args.output}"
+        )
+    if changes["token"] is not None:
+        print(f"Sync token: {changes['token']}")
+        if args.state:
+            with open(args.state, "w") as f:
+                f.write(f"{changes['token']}\n")
+    return 0
+
+
+# ------------------ ARGUMENTS ------------------
+def _add_filters(parser):
+    parser.add_argument("--class", dest="class_name", help="only this class")
+    parser.add_argument("--name", help="only names matching this search")
+    parser.add_argument("--number", help="only roll, GR or phone numbers matching this search")
+    parser.add_argument("--roll", nargs="+", help="only these roll numbers")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Student ID card manager, without the web interface.")
+    parser.add_argument("--backend", choices=["sqlite", "json", "journal"], default=STORAGE_BACKEND)
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    parser.add_argument("--metrics", action="store_true", help="time the run and write the metrics file (IDCARD_METRICS_FILE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="import a CSV or Excel sheet")
+    p.add_argument("file")
+    p.add_argument("--mode", choices=MODES, default="upsert")
+    p.add_argument("--rejects", help="where to write rejected rows (default: rejected_rows_<time>.csv)")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser("generate", help="render card PDFs, reusing unchanged ones")
+    _add_filters(p)
+    p.add_argument("--workers", type=int, default=PDF_WORKERS)
+    p.add_argument("--force", action="store_true", help="re-render cards even when unchanged")
+    p.add_argument("--zip", help="also collect the cards in this ZIP file")
+    p.set_defaults(func=cmd_generate)
+
+    p = commands.add_parser("photos", help="import a ZIP of photos named by roll or GR number")
+    p.add_argument("zip")
+    p.add_argument("--workers", type=int, default=PDF_WORKERS)
+    p.add_argument("--report", help="write unmatched files and students without a photo to this CSV")
+    p.set_defaults(func=cmd_photos)
+
+    p = commands.add_parser("sheets", help="lay cards out on duplex print sheets")
+    p.add_argument("output")
+    _add_filters(p)
+    p.add_argument("--page-size", choices=list(PAGE_SIZES), default="A4")
+    p.set_defaults(func=cmd_sheets)
+
+    p = commands.add_parser("export", help="export students to Excel or CSV")
+    p.add_argument("output")
+    _add_filters(p)
+    p.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the output file extension")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser("changes", help="export only students added, changed or deleted since a sync token or time")
+    p.add_argument("output")
+    p.add_argument("--since", help="sync token from an earlier run, or a date/time such as 2026-10-16T08:00 (default: everything)")
+    p.add_argument("--state", help="file holding the sync token: read when --since is not given, updated after the export")
+    p.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the output file extension")
+    p.set_defaults(func=cmd_changes)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    started = time.perf_counter()
+    try:
+        status = args.func(open_store(args.backend), args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        status = 2
+    metrics.observe("cli_seconds", time.perf_counter() - started, command=args.command)
+    metrics.write()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
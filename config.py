@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+
+# Constants
+DATA_FILE = os.environ.get("IDCARD_DATA_FILE", "student_data.json")
+DB_FILE = os.environ.get("IDCARD_DB_FILE", "student_data.db")
+STORAGE_BACKEND = os.environ.get("IDCARD_STORAGE", "sqlite")  # "sqlite", "json" or "journal"
+JOURNAL_FILE = os.environ.get("IDCARD_JOURNAL_FILE", "student_data.journal")
+JOURNAL_COMPACT_ENTRIES = int(os.environ.get("IDCARD_JOURNAL_COMPACT_ENTRIES", 1000))
+PHOTO_DIR = "photos"
+PDF_DIR = "pdfs"
+ASSET_DIR = "assets"
+CARD_WIDTH, CARD_HEIGHT = 189, 321
+PDF_WORKERS = int(os.environ.get("IDCARD_PDF_WORKERS", os.cpu_count() or 1))
+SPOOL_DIR = os.environ.get("IDCARD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "idcard_spool"))
+PHOTO_DPI = int(os.environ.get("IDCARD_PHOTO_DPI", 300))
+IMPORT_CHUNK_SIZE = int(os.environ.get("IDCARD_IMPORT_CHUNK_SIZE", 5000))
+JOB_DB_FILE = os.environ.get("IDCARD_JOB_DB", "jobs.db")
+JOB_WORKERS = int(os.environ.get("IDCARD_JOB_WORKERS", 2))
+QR_MODE = os.environ.get("IDCARD_QR_MODE", "full")  # "full" or "id" (record id + roll number only)
+METRICS_ENABLED = os.environ.get("IDCARD_METRICS", "0").lower() in ("1", "true", "yes")
+METRICS_FILE = os.environ.get("IDCARD_METRICS_FILE", "metrics.prom")  # Prometheus text, or JSON lines if *.jsonl
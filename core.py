@@ -0,0 +1,182 @@
+"""Student records, card rendering and import/export without Streamlit.
+
+Shared by the app (main.py), its background jobs and the command line
+(cli.py). Importing this module does not load Streamlit, and pandas is only
+loaded when a sheet is imported.
+"""
+import csv
+import os
+import shutil
+import zipfile
+from datetime import datetime
+
+from config import PHOTO_DIR, PDF_DIR, PDF_WORKERS, STORAGE_BACKEND
+from archives import remove_file
+from storage import get_storage
+from repository import StudentRepository
+from cards import generate_pdfs, remove_pdf, remove_pdfs
+from imposition import impose_pdf
+from exports import write_changes, write_export
+from photos import match_photos, normalize_zip_photos, zip_photo_names
+import metrics
+
+
+# ------------------ STORE ------------------
+def open_store(backend=STORAGE_BACKEND):
+    return StudentRepository(get_storage(backend))
+
+def select_students(store, class_name=None, name=None, number=None, roll_nos=None):
+    """Students matching every given filter (all of them when none is given)."""
+    if name or number or class_name:
+        students = store.search(name=name, number=number, class_name=class_name)
+    else:
+        students = store.load_all()
+    if roll_nos:
+        wanted = set(roll_nos)
+        students = [s for s in students if s.get('roll_no') in wanted]
+    return students
+
+def clear_student_files():
+    # Used by "Replace all data": drop every stored photo and card
+    if os.path.exists(PHOTO_DIR):
+        shutil.rmtree(PHOTO_DIR)
+    if os.path.exists(PDF_DIR):
+        shutil.rmtree(PDF_DIR)
+    os.makedirs(PHOTO_DIR, exist_ok=True)
+    os.makedirs(PDF_DIR, exist_ok=True)
+
+def delete_student(store, student_id):
+    student = store.delete(student_id)
+    if student:
+        remove_pdf(student)
+        return True
+    return False
+
+def delete_students(store, student_ids):
+    # One transaction for the whole selection, then one pass over the card files
+    deleted = store.delete_many(student_ids)
+    remove_pdfs(deleted)
+    return len(deleted)
+
+
+# ------------------ CARDS ------------------
+def write_cards_zip(students, zip_file, workers=PDF_WORKERS, force=False, on_progress=None):
+    """Render (or reuse) every card and add it to zip_file, an open ZipSpool.
+
+    Returns (success_count, rendered_count, errors)."""
+    students = list(students)
+    success_count = 0
+    rendered_count = 0
+    errors = []
+    for i, (student, pdf_path, error, rendered) in enumerate(generate_pdfs(students, workers=workers, force=force)):
+        if error is None:
+            zip_file.add(pdf_path)
+            success_count += 1
+            rendered_count += rendered
+        else:
+            errors.append(f"{student['name']}: {error}")
+        if on_progress:
+            on_progress(i + 1, len(students))
+    return success_count, rendered_count, errors
+
+def write_print_sheets(students, output, page_size="A4", on_progress=None):
+    """Impose the students' cards on duplex print sheets; returns the card count."""
+    return impose_pdf(students, output, page_size=page_size, on_progress=on_progress)
+
+
+# ------------------ PHOTOS ------------------
+def import_photos(store, zip_path, workers=PDF_WORKERS, on_progress=None, batch_size=200):
+    """Give students the photos in a ZIP named by roll or GR number.
+
+    Photos are normalized in parallel and their paths saved in batches (also
+    when stopped early). Returns a report: "imported" count, "unmatched"
+    [(file, reason)], "errors" [(file, error)] and "missing" (students still
+    without a photo)."""
+    try:
+        with zipfile.ZipFile(zip_path) as zip_file:
+            names = list(zip_photo_names(zip_file))
+    except zipfile.BadZipFile:
+        raise ValueError(f"Not a ZIP file: {os.path.basename(str(zip_path))}") from None
+    matched, unmatched = match_photos(names, store.load_all())
+    imported = 0
+    errors = []
+    updates, replaced = {}, []
+    now = datetime.now().isoformat()
+
+    def save_batch():
+        # Old photos go only once the new paths are saved, so a failed save never
+        # leaves a student pointing at a deleted file
+        saved = store.update_many(updates)
+        for old_path in replaced:
+            remove_file(old_path)
+        updates.clear()
+        replaced.clear()
+        return saved
+
+    try:
+        with metrics.timed("photo_import_seconds"):
+            for i, (name, photo_path, error) in enumerate(normalize_zip_photos(zip_path, matched, workers)):
+                student = matched[name]
+                if error is None:
+                    old_path = student.get('photo_path')
+                    if old_path and os.path.abspath(old_path) != os.path.abspath(photo_path):
+                        replaced.append(old_path)
+                    updates[student['id']] = {'photo_path': photo_path, 'updated_at': now}
+                else:
+                    errors.append((name, error))
+                metrics.count("photo_import_total", result="error" if error else "imported")
+                if len(updates) >= batch_size:
+                    imported += save_batch()
+                if on_progress:
+                    on_progress(i + 1, len(matched))
+    finally:
+        if updates:
+            imported += save_batch()
+
+    missing = [s for s in store.load_all() if not s.get('photo_path') or not os.path.exists(s['photo_path'])]
+    return {"imported": imported, "unmatched": unmatched, "errors": errors, "missing": missing}
+
+def write_photo_report(report, path):
+    """CSV of everything a photo import left to fix: unmatched and unreadable files, students without a photo."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["problem", "file", "roll_no", "gr_number", "name", "class", "detail"])
+        for name, reason in report["unmatched"]:
+            writer.writerow(["unmatched file", name, "", "", "", "", reason])
+        for name, error in report["errors"]:
+            writer.writerow(["unreadable file", name, "", "", "", "", error])
+        for student in report["missing"]:
+            writer.writerow([
+                "missing photo", "", student.get('roll_no'), student.get('gr_number'),
+                student.get('name'), student.get('class'), ""
+            ])
+
+
+# ------------------ IMPORT / EXPORT ------------------
+def import_file(store, upload, file_name, mode, report_path, on_progress=None):
+    """Stream a CSV/Excel sheet (path or binary file) into the store.
+
+    Invalid rows are written to report_path. "Replace all data" also removes
+    every stored photo and card, once the new list has been saved. Returns the
+    counts from stream_import."""
+    from importer import REPLACE_ALL, read_chunks, stream_import
+
+    if isinstance(upload, (str, os.PathLike)):
+        with open(upload, "rb") as f:
+            counts = stream_import(read_chunks(f, file_name), store, mode, report_path, on_progress)
+    else:
+        counts = stream_import(read_chunks(upload, file_name), store, mode, report_path, on_progress)
+    if mode == REPLACE_ALL:
+        clear_student_files()
+    return counts
+
+def export_students(students, output, fmt):
+    """Write students as an Excel ("xlsx"), CSV or Parquet sheet to a path or binary file."""
+    write_export(students, output, fmt)
+
+def export_changes(store, output, fmt, since=None):
+    """Write the students added, changed or deleted since a sync token or
+    datetime (see StorageBackend.changes_since); returns the changes."""
+    changes = store.changes_since(since)
+    write_changes(changes, output, fmt)
+    return changes
@@ -0,0 +1,165 @@
+import csv
+import glob
+import hashlib
+import io
+import os
+import threading
+from datetime import datetime
+from itertools import islice
+
+from openpyxl import Workbook
+
+from config import SPOOL_DIR
+from storage import STUDENT_FIELDS
+from archives import remove_file
+import metrics
+
+
+EXPORT_FORMATS = ["xlsx", "csv", "parquet"]
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_CHUNK_SIZE = 5000
+CACHE_DIR = os.path.join(SPOOL_DIR, "exports")
+
+
+# ------------------ WRITERS ------------------
+def export_columns(students):
+    """Stored fields first, then any extra keys (JSON records may carry more)."""
+    columns = list(STUDENT_FIELDS)
+    seen = set(columns)
+    for student in students:
+        for key in student:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+def _chunks(students, columns):
+    students = iter(students)
+    while True:
+        batch = list(islice(students, EXPORT_CHUNK_SIZE))
+        if not batch:
+            return
+        yield [[student.get(col) for col in columns] for student in batch]
+
+def write_xlsx(students, output, columns):
+    # Write-only workbook: rows are streamed to the file instead of kept as cell objects
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Students")
+    sheet.append(columns)
+    for rows in _chunks(students, columns):
+        for row in rows:
+            sheet.append(row)
+    workbook.save(output)
+
+def write_csv(students, output, columns):
+    def write(f):
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in _chunks(students, columns):
+            writer.writerows(rows)
+
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "w", newline="", encoding="utf-8") as f:
+            write(f)
+    else:
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        write(text)
+        text.flush()
+        text.detach()
+
+def write_parquet(students, output, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Everything is text except the numeric id, so every chunk shares one schema
+    schema = pa.schema([(col, pa.int64() if col == "id" else pa.string()) for col in columns])
+    with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+        for rows in _chunks(students, columns):
+            data = {
+                col: [value if value is None or col == "id" else str(value) for value in values]
+                for col, values in zip(columns, zip(*rows))
+            }
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+
+def write_export(students, output, fmt, columns=None):
+    """Write students to a path or binary file as "xlsx", "csv" or "parquet"."""
+    writers = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+    if fmt not in writers:
+        raise ValueError(f"Unknown export format: {fmt}")
+    students = list(students)
+    with metrics.timed("export_seconds", format=fmt):
+        writers[fmt](students, output, columns or export_columns(students))
+
+
+# ------------------ CHANGES ------------------
+def parse_since(text):
+    """A sync token ("42") or an ISO date/time ("2026-10-16 08:00"); empty means everything."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Not a sync token or date/time: {text}") from None
+
+def change_rows(changes):
+    """One row per changed student ("upsert") and per tombstone ("delete")."""
+    return [{"change": "upsert", **s} for s in changes["students"]] + [{"change": "delete", **t} for t in changes["deleted"]]
+
+def write_changes(changes, output, fmt):
+    # Tombstones only fill id, roll_no, gr_number and deleted_at
+    rows = change_rows(changes)
+    columns = ["change"] + [col for col in export_columns(rows) if col != "change"]
+    if "deleted_at" not in columns:
+        columns.append("deleted_at")
+    write_export(rows, output, fmt, columns)
+
+def changes_bytes(changes, fmt):
+    output = io.BytesIO()
+    write_changes(changes, output, fmt)
+    return output.getvalue()
+
+def changes_file_name(changes, since, fmt):
+    if changes["full"] or changes["token"] is None:
+        return f"students_full_{changes['token'] or datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    start = since if isinstance(since, int) else since.strftime('%Y%m%d_%H%M%S')
+    return f"students_changes_{start}_to_{changes['token']}.{fmt}"
+
+
+# ------------------ CACHE ------------------
+def _version_token(store, version):
+    # A version counter restarts with a new database, so the backend and file are part of the key
+    key = (type(store.storage).__name__, os.path.abspath(store.storage.path), version)
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+
+def cached_export(store, fmt):
+    """Path of the full export for the store's current data version, built on
+    first request. Older versions of the same format are removed."""
+    version, students = store.load_versioned()
+    path = os.path.join(CACHE_DIR, f"students_{_version_token(store, version)}.{fmt}")
+    if os.path.exists(path):
+        metrics.count("export_cache_total", format=fmt, result="hit")
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write_export(students, tmp_path, fmt)
+        os.replace(tmp_path, path)
+    finally:
+        remove_file(tmp_path)
+    metrics.count("export_cache_total", format=fmt, result="built")
+    for old_path in glob.glob(os.path.join(CACHE_DIR, f"students_*.{fmt}")):
+        if old_path != path:
+            remove_file(old_path)
+    return path
+
+def export_bytes(store, fmt):
+    with open(cached_export(store, fmt), "rb") as f:
+        return f.read()
@@ -0,0 +1,258 @@
+import csv
+import os
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from config import IMPORT_CHUNK_SIZE
+import metrics
+
+
+REQUIRED_COLUMNS = [
+    'name', 'father_name', 'roll_no', 'class', 'phone', 'gr_number',
+    'date_of_birth', 'date_of_issue', 'date_of_expiry', 'photo_path',
+]
+TEXT_COLUMNS = ['name', 'father_name', 'roll_no', 'class', 'phone', 'gr_number']
+# Read as text so phones keep their leading zero and numbers in gappy columns don't become floats
+TEXT_DTYPES = {col: str for col in TEXT_COLUMNS}
+DATE_COLUMNS = ['date_of_birth', 'date_of_issue', 'date_of_expiry']
+
+ADD_NEW = "Add new students only"
+REPLACE_ALL = "Replace all data"
+UPSERT = "Update existing + add new"
+IMPORT_MODES = [ADD_NEW, REPLACE_ALL, UPSERT]
+
+
+# ------------------ COLUMN NORMALIZATION ------------------
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+def _parse_dates(column, errors="raise"):
+    try:
+        parsed = pd.to_datetime(column, errors=errors)
+    except (ValueError, TypeError):
+        # Mixed formats in one column; fall back to per-value parsing
+        parsed = pd.to_datetime(column, format="mixed", errors=errors)
+    if errors == "coerce":
+        retry = parsed.isna() & column.notna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(column[retry], format="mixed", errors="coerce")
+    return parsed
+
+def _iso_dates(parsed):
+    return parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None)
+
+def normalize_frame(df, parsed_dates=None):
+    """Parse and type every import column once, returning a frame of plain strings/None."""
+    out = pd.DataFrame(index=df.index)
+    for col in TEXT_COLUMNS:
+        out[col] = df[col].map(lambda value: str(value) if pd.notna(value) else '')
+    for col in DATE_COLUMNS:
+        parsed = parsed_dates[col] if parsed_dates else _parse_dates(df[col])
+        out[col] = _iso_dates(parsed)
+    photos = df['photo_path'] if 'photo_path' in df.columns else pd.Series(None, index=df.index)
+    out['photo_path'] = pd.Series(
+        [str(p) if pd.notna(p) else None for p in photos.tolist()], index=df.index, dtype=object
+    )
+    return out
+
+
+# ------------------ MERGE ------------------
+@metrics.timed("import_merge_seconds")
+def merge_import(current, df, mode, now=None):
+    """Merge an import frame into the current student list on roll_no.
+
+    Returns (new_data, changed, added, updated), where changed holds only the
+    added and updated records so a non-replacing import can be persisted as one
+    batch upsert. Existing roll numbers are looked up in a dict, so the merge is
+    linear in the size of both lists. New records have no id yet; the store
+    assigns one when they are saved."""
+    now = now or datetime.now().isoformat()
+    rows = normalize_frame(df)
+
+    new_data = [] if mode == REPLACE_ALL else list(current)
+    by_roll = {}
+    for i, student in enumerate(new_data):
+        by_roll.setdefault(student['roll_no'], i)
+
+    changed = {}
+    added = 0
+    updated = 0
+    columns = list(rows.columns)
+    for values in zip(*(rows[col].tolist() for col in columns)):
+        student_data = dict(zip(columns, values))
+        existing_idx = by_roll.get(student_data['roll_no'])
+
+        if existing_idx is None:
+            student_data = {'id': None, **student_data, 'created_at': now}
+            by_roll[student_data['roll_no']] = len(new_data)
+            new_data.append(student_data)
+            changed[student_data['roll_no']] = student_data
+            added += 1
+        elif mode == UPSERT:
+            existing = new_data[existing_idx]
+            student_data.update({
+                'id': existing['id'],
+                'photo_path': existing.get('photo_path'),
+                'created_at': existing.get('created_at') or now,
+                'updated_at': now,
+            })
+            new_data[existing_idx] = student_data
+            changed[student_data['roll_no']] = student_data
+            updated += 1
+
+    return new_data, list(changed.values()), added, updated
+
+
+# ------------------ STREAMING IMPORT ------------------
+def _stream_size(file):
+    # Uploaded files carry a size; plain file objects are measured by seeking to the end
+    size = getattr(file, 'size', None)
+    if size is None and file.seekable():
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+    return size
+
+def read_chunks(file, file_name, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield (frame, progress) pairs without materializing the whole sheet;
+    progress is the fraction of the file consumed so far."""
+    name = file_name.lower()
+    if name.endswith('.csv'):
+        total = _stream_size(file)
+        for df in pd.read_csv(file, chunksize=chunk_size, dtype=TEXT_DTYPES):
+            yield df, min(file.tell() / total, 1.0) if total else None
+    elif name.endswith('.xlsx'):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = max((sheet.max_row or 1) - 1, 1)
+            rows = sheet.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+            text = {i for i, col in enumerate(header) if col in TEXT_DTYPES}
+            batch, done = [], 0
+            for row in rows:
+                if any(value is not None for value in row):
+                    batch.append([
+                        str(value) if i in text and value is not None else value
+                        for i, value in enumerate(row[:len(header)])
+                    ])
+                done += 1
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame.from_records(batch, columns=header), min(done / total, 1.0)
+                    batch = []
+            if batch:
+                yield pd.DataFrame.from_records(batch, columns=header), 1.0
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls has no streaming reader; read it once and hand it out in slices
+        df = pd.read_excel(file, dtype=TEXT_DTYPES)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size], min((start + chunk_size) / len(df), 1.0)
+
+def read_sheet(file, file_name):
+    """Whole CSV or Excel sheet as one frame, text columns kept as written."""
+    if file_name.lower().endswith('.csv'):
+        return pd.read_csv(file, dtype=TEXT_DTYPES)
+    return pd.read_excel(file, dtype=TEXT_DTYPES)
+
+def validate_frame(df):
+    """Split a raw chunk into (normalized valid rows, {index: [reasons]})."""
+    reasons = {}
+
+    def reject(mask, reason):
+        for idx in df.index[mask.to_numpy()]:
+            reasons.setdefault(idx, []).append(reason(idx))
+
+    for col in ('name', 'roll_no'):
+        reject(df[col].isna() | df[col].astype(str).str.strip().eq(''), lambda idx, col=col: f"missing {col}")
+
+    parsed_dates = {}
+    for col in DATE_COLUMNS:
+        parsed_dates[col] = _parse_dates(df[col], errors="coerce")
+        reject(parsed_dates[col].isna(), lambda idx, col=col: f"invalid {col} {df.at[idx, col]!r}")
+    reject(
+        parsed_dates['date_of_expiry'] < parsed_dates['date_of_issue'],
+        lambda idx: "date_of_expiry is before date_of_issue"
+    )
+
+    valid = df.index.difference(list(reasons))
+    normalized = normalize_frame(df.loc[valid], {col: parsed[valid] for col, parsed in parsed_dates.items()})
+    return normalized, reasons
+
+def stream_import(chunks, store, mode, report_path, on_progress=None):
+    """Validate and commit an import chunk by chunk.
+
+    Each chunk is merged against the store through an indexed roll_no lookup and
+    persisted in one batch, so memory is bounded by the chunk size. "Replace all
+    data" instead stages the rows and swaps them in with one save_all at the end,
+    so a bad sheet or a cancel leaves the roster as it was. Rows that fail
+    validation are written to a CSV report at report_path with their reason.
+    Returns a dict of counts."""
+    now = datetime.now().isoformat()
+    counts = {'rows': 0, 'added': 0, 'updated': 0, 'skipped': 0, 'rejected': 0}
+    staged = {} if mode == REPLACE_ALL else None
+
+    with open(report_path, "w", newline="") as report_file:
+        report = csv.writer(report_file)
+        report.writerow(['row', 'reason'] + REQUIRED_COLUMNS)
+
+        for df, progress in chunks:
+            missing = missing_columns(df)
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+            df = df.reset_index(drop=True)
+            with metrics.timed("import_chunk_seconds", stage="validate"):
+                valid, reasons = validate_frame(df)
+                for idx, row_reasons in sorted(reasons.items()):
+                    raw = ['' if pd.isna(df.at[idx, col]) else df.at[idx, col] for col in REQUIRED_COLUMNS]
+                    report.writerow([counts['rows'] + idx + 2, "; ".join(row_reasons)] + raw)
+            counts['rejected'] += len(reasons)
+
+            if staged is None:
+                with metrics.timed("import_chunk_seconds", stage="lookup"):
+                    existing = store.get_by_rolls(valid['roll_no'].tolist())
+            else:
+                existing = staged
+            batch = {}
+            columns = list(valid.columns)
+            for values in zip(*(valid[col].tolist() for col in columns)):
+                student_data = dict(zip(columns, values))
+                current = batch.get(student_data['roll_no']) or existing.get(student_data['roll_no'])
+
+                if current is None:
+                    # The store assigns ids to new records as the batch is saved
+                    student_data = {'id': None, **student_data, 'created_at': now}
+                    counts['added'] += 1
+                elif mode == UPSERT:
+                    student_data.update({
+                        'id': current['id'],
+                        'photo_path': current.get('photo_path'),
+                        'created_at': current.get('created_at') or now,
+                        'updated_at': now,
+                    })
+                    counts['updated'] += 1
+                else:
+                    counts['skipped'] += 1
+                    continue
+                batch[student_data['roll_no']] = student_data
+
+            if staged is not None:
+                staged.update(batch)
+            elif batch:
+                with metrics.timed("import_chunk_seconds", stage="persist"):
+                    store.upsert_many(list(batch.values()))
+            counts['rows'] += len(df)
+            if on_progress:
+                on_progress(progress, counts)
+
+    if staged is not None:
+        with metrics.timed("import_chunk_seconds", stage="persist"):
+            store.save_all(list(staged.values()))
+
+    for outcome in ('added', 'updated', 'skipped', 'rejected'):
+        metrics.count("import_rows_total", counts[outcome], outcome=outcome)
+    return counts
@@ -0,0 +1,110 @@
+from itertools import islice
+
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.pdfgen import canvas
+
+from cards import draw_front, draw_back
+from config import CARD_WIDTH, CARD_HEIGHT
+
+
+PAGE_SIZES = {"A4": A4, "Letter": letter}
+CROP_MARK_LENGTH = 8
+CROP_MARK_OFFSET = 2
+
+
+# ------------------ SHEET LAYOUT ------------------
+def sheet_layout(page_size="A4", margin=12, gutter=0):
+    """Return (columns, rows, slots) where slots are the lower-left corners of
+    each card on the sheet, filled left to right, top to bottom."""
+    page_w, page_h = PAGE_SIZES[page_size]
+    columns = int((page_w - 2 * margin + gutter) // (CARD_WIDTH + gutter))
+    rows = int((page_h - 2 * margin + gutter) // (CARD_HEIGHT + gutter))
+    if columns < 1 or rows < 1:
+        raise ValueError(f"A card does not fit on a {page_size} sheet with a {margin}pt margin")
+
+    grid_w = columns * CARD_WIDTH + (columns - 1) * gutter
+    grid_h = rows * CARD_HEIGHT + (rows - 1) * gutter
+    left = (page_w - grid_w) / 2
+    top = (page_h + grid_h) / 2
+
+    slots = []
+    for row in range(rows):
+        for col in range(columns):
+            x = left + col * (CARD_WIDTH + gutter)
+            y = top - (row + 1) * CARD_HEIGHT - row * gutter
+            slots.append((x, y))
+    return columns, rows, slots
+
+
+def _back_slot(index, columns, rows, flip):
+    # Backs land behind their fronts once the sheet is turned over
+    row, col = divmod(index, columns)
+    if flip == "long":
+        col = columns - 1 - col
+    else:
+        row = rows - 1 - row
+    return row * columns + col
+
+
+def _draw_crop_marks(c, slots):
+    xs = sorted({x for x, _ in slots} | {x + CARD_WIDTH for x, _ in slots})
+    ys = sorted({y for _, y in slots} | {y + CARD_HEIGHT for _, y in slots})
+    c.saveState()
+    c.setLineWidth(0.25)
+    for x in xs:
+        c.line(x, ys[0] - CROP_MARK_OFFSET, x, ys[0] - CROP_MARK_OFFSET - CROP_MARK_LENGTH)
+        c.line(x, ys[-1] + CROP_MARK_OFFSET, x, ys[-1] + CROP_MARK_OFFSET + CROP_MARK_LENGTH)
+    for y in ys:
+        c.line(xs[0] - CROP_MARK_OFFSET, y, xs[0] - CROP_MARK_OFFSET - CROP_MARK_LENGTH, y)
+        c.line(xs[-1] + CROP_MARK_OFFSET, y, xs[-1] + CROP_MARK_OFFSET + CROP_MARK_LENGTH, y)
+    c.restoreState()
+
+
+def _place(c, x, y, draw, *args):
+    c.saveState()
+    c.translate(x, y)
+    p = c.beginPath()
+    p.rect(0, 0, CARD_WIDTH, CARD_HEIGHT)
+    c.clipPath(p, stroke=0, fill=0)
+    draw(c, *args)
+    c.restoreState()
+
+
+# ------------------ IMPOSED PDF ------------------
+def impose_pdf(students, output, page_size="A4", margin=12, gutter=0, flip="long",
+               crop_marks=True, on_progress=None):
+    """Write students as a print-ready PDF: a sheet of fronts followed by a sheet
+    of matching backs for duplex printing. `output` is a path or binary file.
+
+    Students are consumed one sheet at a time, and the template backgrounds are
+    shared form XObjects, so each is embedded once for the whole document."""
+    columns, rows, slots = sheet_layout(page_size, margin, gutter)
+    c = canvas.Canvas(output, pagesize=PAGE_SIZES[page_size], pageCompression=1)
+    c.setTitle("ID Card Print Sheets")
+
+    students = iter(students)
+    done = 0
+    while True:
+        batch = list(islice(students, len(slots)))
+        if not batch:
+            break
+
+        for (x, y), student in zip(slots, batch):
+            _place(c, x, y, draw_front, student, student.get('photo_path'))
+        if crop_marks:
+            _draw_crop_marks(c, slots)
+        c.showPage()
+
+        for i, student in enumerate(batch):
+            x, y = slots[_back_slot(i, columns, rows, flip)]
+            _place(c, x, y, draw_back, student)
+        if crop_marks:
+            _draw_crop_marks(c, slots)
+        c.showPage()
+
+        done += len(batch)
+        if on_progress:
+            on_progress(done)
+
+    c.save()
+    return done
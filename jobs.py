@@ -0,0 +1,322 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import JOB_DB_FILE, JOB_WORKERS
+from archives import ZipSpool, spool_path, remove_file
+from core import import_file, import_photos, write_cards_zip, write_photo_report, write_print_sheets
+from photos import renormalize_photos
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    "id" TEXT PRIMARY KEY,
+    "kind" TEXT NOT NULL,
+    "label" TEXT,
+    "status" TEXT NOT NULL,
+    "progress" REAL DEFAULT 0,
+    "message" TEXT,
+    "result" TEXT,
+    "error" TEXT,
+    "cancel_requested" INTEGER DEFAULT 0,
+    "created_at" TEXT,
+    "started_at" TEXT,
+    "finished_at" TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs("created_at");
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ------------------ JOB HANDLE ------------------
+class Job:
+    """Handle passed to a running task for reporting progress.
+
+    progress() raises JobCancelled once a cancel was requested, so tasks stop
+    at their next progress report. Database writes are throttled."""
+
+    def __init__(self, runner, job_id, cancel_event, interval=0.5):
+        self.id = job_id
+        self._runner = runner
+        self._cancel_event = cancel_event
+        self._interval = interval
+        self._last_write = 0.0
+
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def progress(self, fraction, message=None):
+        if self.cancelled():
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._last_write >= self._interval:
+            self._last_write = now
+            fields = {"progress": min(max(fraction or 0.0, 0.0), 1.0)}
+            if message is not None:
+                fields["message"] = message
+            self._runner._set(self.id, **fields)
+
+
+# ------------------ RUNNER ------------------
+class JobRunner:
+    """Runs bulk operations on a thread pool and records them in a job table.
+
+    Jobs outlive the Streamlit rerun and the browser session that queued them:
+    any session can list, poll or cancel them and download finished artifacts.
+    Jobs left queued or running by a previous server process are marked failed."""
+
+    def __init__(self, path=JOB_DB_FILE, workers=JOB_WORKERS):
+        self.path = path
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="idcard-job")
+        self._lock = threading.Lock()
+        self._cancel_events = {}
+        self._futures = {}
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                'UPDATE jobs SET "status" = ?, "error" = ?, "finished_at" = ? WHERE "status" IN (?, ?)',
+                (FAILED, "Interrupted by a server restart", datetime.now().isoformat(), *ACTIVE_STATES)
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _set(self, job_id, **fields):
+        assignments = ", ".join(f'"{k}" = ?' for k in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE "id" = ?', list(fields.values()) + [job_id])
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else {}
+        return job
+
+    # Public API
+    def submit(self, kind, label, func, *args, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the new job id.
+
+        func may return a dict; "message" is shown with the job and "path",
+        "file_name" and "mime" describe a downloadable artifact."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs ("id", "kind", "label", "status", "created_at") VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, label, QUEUED, datetime.now().isoformat())
+            )
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+            self._futures[job_id] = self._pool.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+        try:
+            if cancel_event.is_set():
+                raise JobCancelled()
+            self._set(job_id, status=RUNNING, started_at=datetime.now().isoformat())
+            result = func(Job(self, job_id, cancel_event), *args, **kwargs) or {}
+        except JobCancelled:
+            self._set(job_id, status=CANCELLED, message="Cancelled", finished_at=datetime.now().isoformat())
+        except Exception as e:
+            self._set(job_id, status=FAILED, error=str(e), finished_at=datetime.now().isoformat())
+        else:
+            self._set(
+                job_id,
+                status=DONE,
+                progress=1.0,
+                message=result.get("message"),
+                result=json.dumps(result, default=str),
+                finished_at=datetime.now().isoformat()
+            )
+        finally:
+            self._forget(job_id)
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._cancel_events.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT * FROM jobs WHERE "id" = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, kinds=None, limit=10):
+        query = 'SELECT * FROM jobs'
+        params = []
+        if kinds:
+            query += f' WHERE "kind" IN ({", ".join("?" for _ in kinds)})'
+            params.extend(kinds)
+        query += ' ORDER BY "created_at" DESC LIMIT ?'
+        rows = self._connect().execute(query, params + [limit]).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Request cancellation; a queued job never starts, a running one stops at its next progress report."""
+        self._set(job_id, cancel_requested=1)
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+            future = self._futures.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        if future is not None and future.cancel():
+            # Never started: _run will not be called, so record the outcome here
+            self._set(job_id, status=CANCELLED, message="Cancelled", finished_at=datetime.now().isoformat())
+            self._forget(job_id)
+        return True
+
+
+# ------------------ BULK TASKS ------------------
+def generate_cards_task(job, students, workers):
+    """Render every card and collect them in a spooled ZIP."""
+    students = list(students)
+    with ZipSpool() as zipf:
+        success_count, rendered_count, errors = write_cards_zip(
+            students,
+            zipf,
+            workers=workers,
+            on_progress=lambda done, total: job.progress(done / total, f"{done} of {total} cards")
+        )
+    return {
+        "message": (
+            f"Generated {success_count} of {len(students)} ID cards "
+            f"({rendered_count} rendered, {success_count - rendered_count} reused)."
+        ),
+        "errors": errors,
+        "path": zipf.path,
+        "file_name": "All_ID_Cards.zip",
+        "mime": "application/zip",
+    }
+
+def print_sheets_task(job, students, page_size):
+    students = list(students)
+    sheet_path = spool_path(".pdf")
+    try:
+        write_print_sheets(
+            students,
+            sheet_path,
+            page_size=page_size,
+            on_progress=lambda done: job.progress(done / len(students), f"{done} of {len(students)} cards")
+        )
+    except BaseException:
+        remove_file(sheet_path)
+        raise
+    return {
+        "message": f"Laid out {len(students)} ID cards on print sheets.",
+        "path": sheet_path,
+        "file_name": f"print_sheets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+        "mime": "application/pdf",
+    }
+
+def import_task(job, store, upload_path, file_name, mode):
+    """Stream an uploaded sheet into the store; the upload is removed afterwards.
+
+    Batches committed before a cancel stay committed; a replace commits
+    nothing until the whole sheet has been read."""
+    report_path = spool_path(".csv")
+    try:
+        counts = import_file(
+            store,
+            upload_path,
+            file_name,
+            mode,
+            report_path,
+            on_progress=lambda progress, counts: job.progress(
+                progress, f"Processed {counts['rows']} rows · {counts['rejected']} rejected"
+            )
+        )
+    except BaseException:
+        remove_file(report_path)
+        raise
+    finally:
+        remove_file(upload_path)
+
+    result = {
+        "message": (
+            f"Added {counts['added']} new students, updated {counts['updated']}, "
+            f"skipped {counts['skipped']} duplicates, rejected {counts['rejected']} invalid rows."
+        ),
+        "counts": counts,
+    }
+    if counts['rejected']:
+        result.update({
+            "path": report_path,
+            "file_name": f"rejected_rows_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "mime": "text/csv",
+        })
+    else:
+        os.remove(report_path)
+    return result
+
+def renormalize_task(job, store, students, batch_size=50):
+    """Re-normalize photos in batches, saving each batch's new paths before
+    checking for cancellation so a cancelled run never loses a path."""
+    students = list(students)
+    normalized = 0
+    errors = []
+    for start in range(0, len(students), batch_size):
+        job.progress(start / len(students), f"{start} of {len(students)} photos")
+        batch = students[start:start + batch_size]
+        photo_updates, photo_errors = renormalize_photos(batch)
+        store.update_many({student_id: {'photo_path': photo_path} for student_id, photo_path in photo_updates.items()})
+        for student in batch:
+            if student['id'] in photo_updates:
+                remove_file(student['photo_path'])
+        normalized += len(photo_updates)
+        errors.extend(f"{student['name']}: {error}" for student, error in photo_errors)
+    return {"message": f"Normalized {normalized} photo(s).", "errors": errors}
+
+def photo_zip_task(job, store, upload_path, workers):
+    """Import a ZIP of photos named by roll or GR number; the upload is removed afterwards.
+
+    A report of unmatched files and students still without a photo is offered for download."""
+    try:
+        report = import_photos(
+            store,
+            upload_path,
+            workers=workers,
+            on_progress=lambda done, total: job.progress(done / total, f"{done} of {total} photos")
+        )
+    finally:
+        remove_file(upload_path)
+
+    result = {
+        "message": (
+            f"Imported {report['imported']} photo(s). {len(report['unmatched'])} file(s) matched no student; "
+            f"{len(report['missing'])} student(s) still have no photo."
+        ),
+        "errors": [f"{name}: {error}" for name, error in report['errors']],
+    }
+    if report['unmatched'] or report['errors'] or report['missing']:
+        report_path = spool_path(".csv")
+        write_photo_report(report, report_path)
+        result.update({
+            "path": report_path,
+            "file_name": f"photo_import_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "mime": "text/csv",
+        })
+    return result
@@ -1,25 +1,29 @@
 import streamlit as st
 from PIL import Image
 from streamlit_cropper import st_cropper
-from reportlab.pdfgen import canvas
-from reportlab.lib.colors import HexColor, white
-from reportlab.graphics.barcode import qr
-from reportlab.graphics.shapes import Drawing
-import json
 import os
-import pandas as pd
 from datetime import date, datetime
-import zipfile
-from io import BytesIO
-import shutil
+from functools import partial
+import time
 from pathlib import Path
+from config import PHOTO_DIR, PDF_DIR, PDF_WORKERS
+from cards import generate_pdf, ensure_pdf, card_pdf_bytes, pdf_path_for
+from imposition import PAGE_SIZES, sheet_layout
+from archives import ZipSpool, SessionSpool, spool_path, sweep_stale, read_file
+from photos import normalize_photo, ui_photo
+from previews import card_preview
+from importer import IMPORT_MODES, REPLACE_ALL, UPSERT, merge_import, missing_columns, read_chunks, read_sheet
+from core import open_store, clear_student_files, delete_student, delete_students
+from storage import ConflictError
+from exports import EXPORT_FORMATS, MIME_TYPES, changes_bytes, changes_file_name, export_bytes, parse_since
+import metrics
+from jobs import (
+    ACTIVE_STATES, DONE, FAILED, JobRunner,
+    generate_cards_task, import_task, photo_zip_task, print_sheets_task, renormalize_task,
+)
 
 
-# Constants
-DATA_FILE = "student_data.json"
-PHOTO_DIR = "photos"
-PDF_DIR = "pdfs"
-CARD_WIDTH, CARD_HEIGHT = 189, 321
+rerun_started = time.perf_counter()
 
 # Ensure required folders exist
 Path(PHOTO_DIR).mkdir(parents=True, exist_ok=True)
@@ -50,6 +54,15 @@ if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = False
 if 'edit_student_id' not in st.session_state:
     st.session_state.edit_student_id = None
+if 'edit_base' not in st.session_state:
+    # The record as it was when editing started; saving fails if someone changed it since
+    st.session_state.edit_base = None
+if 'downloads' not in st.session_state:
+    # Spooled ZIP/PDF artifacts for this session; files are removed with the session
+    st.session_state.downloads = SessionSpool()
+if 'changes_export' not in st.session_state:
+    # (since, changes) from the last "Find Changes"; its downloads use exactly this result
+    st.session_state.changes_export = None
 
 # ------------------ PERSIST LOGIN FROM URL ------------------
 params = st.query_params
@@ -133,143 +146,101 @@ page = st.sidebar.selectbox(
 if st.sidebar.button("🔒 Logout"):
     logout()
 
+# Manage Students list options: label -> (field, descending)
+SORT_KEYS = {
+    "Best match": (None, False),
+    "Name": ("name", False),
+    "Roll Number": ("roll_no", False),
+    "Class": ("class", False),
+    "Newest first": ("created_at", True),
+    "Card expiry": ("date_of_expiry", False),
+}
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+
 # Helper Functions
+@st.cache_resource
+def get_repository():
+    # One cached repository per server process, shared by every session
+    return open_store()
+
+store = get_repository()
+
+@st.cache_resource
+def get_job_runner():
+    # Shared by every session so a job can be polled or cancelled from any browser
+    return JobRunner()
+
+job_runner = get_job_runner()
+
+@st.cache_resource
+def sweep_spool():
+    # Once per server start: drop artifacts orphaned by a previous run
+    return sweep_stale()
+
+sweep_spool()
+
 def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return []
-
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4, default=str)
-
-def int_to_roman(num):
-    if not num or not str(num).isdigit():
-        return str(num)
-    num = int(num)
-    val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
-    syms = ["M", "CM", "D", "CD", "C", "XC", "L", "XL", "X", "IX", "V", "IV", "I"]
-    roman = ""
-    i = 0
-    while num > 0:
-        for _ in range(num // val[i]):
-            roman += syms[i]
-            num -= val[i]
-        i += 1
-    return roman
-
-def generate_pdf(info, img_path):
-    pdf_filename = f"{info['roll_no'].replace(' ', '_')}_card.pdf"
-    pdf_path = os.path.join(PDF_DIR, pdf_filename)
-    c = canvas.Canvas(pdf_path, pagesize=(CARD_WIDTH, CARD_HEIGHT))
-
-    # FRONT SIDE
-    front_bg_path = "assets/1.jpeg"
-    if os.path.exists(front_bg_path):
-        c.drawImage(front_bg_path, 0, 0, 189, 321)
-
-    c.setFillColor(HexColor("#231f55"))
-    c.setFont("Helvetica-Bold", 9)
-    c.drawCentredString(94.5, 140, info['name'].upper())
-    c.drawCentredString(94.5, 113, info['father_name'].upper())
-
-    c.setFillColor(white)
-    c.setFont("Helvetica-Bold", 9)
-    roman_class = int_to_roman(info['class'])
-    c.drawCentredString(90.5, 95, "Level" + "-" + roman_class)
-
-    c.setFillColor(HexColor("#231f55"))
-    c.setFont("Helvetica", 9)
-    c.drawString(65, 67, info['roll_no'])
-    c.drawString(65, 52, info['gr_number'])
-    c.drawString(65, 37, datetime.fromisoformat(info["date_of_birth"]).strftime("%d %B, %Y"))
-
-    # Draw photo if exists
-    if img_path and os.path.exists(img_path):
-        img_x = CARD_WIDTH - 149
-        img_y = CARD_HEIGHT - 161.5
-        img_size = 103
-
-        # Draw circular clipping path
-        c.saveState()
-        p = c.beginPath()
-        center_x = img_x + img_size / 2
-        center_y = img_y + img_size / 2
-        radius = img_size / 2
-
-        p.circle(center_x, center_y, radius)
-        c.clipPath(p, stroke=0, fill=0)
-
-        # Draw the image inside the circle
-        c.drawImage(img_path, img_x, img_y, width=img_size, height=img_size, mask='auto')
-        c.restoreState()
-
-    c.showPage()
-
-    # BACK SIDE
-    back_bg_path = "assets/2.jpeg"
-    if os.path.exists(back_bg_path):
-        c.drawImage(back_bg_path, 0, 0, 189, 321)
-
-    # Generate QR Code
-    qr_data = f"""Name: {info['name']}
-Father Name: {info['father_name']}
-Roll No: {info['roll_no']}
-GR NO: {info['gr_number']}
-DOB: {datetime.fromisoformat(info["date_of_birth"]).strftime("%d %B, %Y")}
-Issue: {datetime.fromisoformat(info["date_of_issue"]).strftime("%d %B, %Y")}
-Expiry: {datetime.fromisoformat(info["date_of_expiry"]).strftime("%d %B, %Y")}
-Phone: {info['phone']}"""
-
-    qr_code = qr.QrCodeWidget(qr_data)
-    bounds = qr_code.getBounds()
-    width_qr = bounds[2] - bounds[0]
-    height_qr = bounds[3] - bounds[1]
-
-    qr_size = 80
-    scale_x = qr_size / width_qr 
-    scale_y = qr_size / height_qr
-
-    d = Drawing(qr_size, qr_size, transform=[scale_x, 0, 0, scale_y, 0, 0])
-    d.add(qr_code)
-    d.drawOn(c, 50, 125)
-
-    c.setFillColor(HexColor("#231f55"))
-    c.setFont("Helvetica-Bold", 8)
-    c.drawString(95, 104, datetime.fromisoformat(info["date_of_issue"]).strftime("%d %B, %Y"))
-    c.drawString(95, 93, datetime.fromisoformat(info["date_of_expiry"]).strftime("%d %B, %Y"))
-
-    c.setFillColor(white)
-    c.setFont("Helvetica-Bold", 8.5)
-    c.drawString(85.5, 62.5, info['phone'])
-
-    c.save()
-    return pdf_path
-
-def delete_student(student_id):
-    data = load_data()
-    student_to_delete = None
+    with metrics.timed("load_data_seconds"):
+        return store.load_all()
+
+def save_data(data, expected_version=None):
+    with metrics.timed("save_data_seconds"):
+        store.save_all(data, expected_version=expected_version)
+
+def spooled_download_button(key, label, mime):
+    # Served from the spool file on click instead of holding the bytes in every rerun
+    path = st.session_state.downloads.get(key)
+    if path:
+        st.download_button(
+            label,
+            data=partial(read_file, path),
+            file_name=st.session_state.downloads.file_name(key),
+            mime=mime,
+            on_click="ignore",
+            key=f"download_{key}"
+        )
+
+def job_panel(kinds):
+    # Re-polls the job table every two seconds while any listed job is still queued or running
+    active = any(job['status'] in ACTIVE_STATES for job in job_runner.list_jobs(kinds))
     
-    for i, student in enumerate(data):
-        if student.get('id') == student_id:
-            student_to_delete = student
-            data.pop(i)
-            break
+    @st.fragment(run_every=2 if active else None)
+    def show_jobs():
+        jobs = job_runner.list_jobs(kinds)
+        if not jobs:
+            return
+        st.markdown("**⏳ Background Jobs**")
+        for job in jobs:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.caption(f"{job['label']} · {job['status']} · queued {job['created_at'][:19].replace('T', ' ')}")
+                if job['status'] in ACTIVE_STATES:
+                    st.progress(job['progress'] or 0.0, text=job['message'] or "Waiting...")
+                elif job['status'] == DONE:
+                    st.success(job['message'] or "Done")
+                    for error in job['result'].get('errors', [])[:20]:
+                        st.error(f"❌ {error}")
+                elif job['status'] == FAILED:
+                    st.error(f"Failed: {job['error']}")
+                else:
+                    st.info(job['message'] or job['status'].title())
+            with col2:
+                result = job['result']
+                if job['status'] in ACTIVE_STATES:
+                    if st.button("✖️ Cancel", key=f"cancel_job_{job['id']}"):
+                        job_runner.cancel(job['id'])
+                        st.rerun(scope="fragment")
+                elif result.get('path') and os.path.exists(result['path']):
+                    st.download_button(
+                        "⬇️ Download",
+                        data=partial(read_file, result['path']),
+                        file_name=result.get('file_name'),
+                        mime=result.get('mime'),
+                        on_click="ignore",
+                        key=f"download_job_{job['id']}"
+                    )
     
-    if student_to_delete:
-        # # Delete associated files
-        # if student_to_delete.get('photo_path') and os.path.exists(student_to_delete['photo_path']):
-        #     os.remove(student_to_delete['photo_path'])
-        
-        pdf_filename = f"{student_to_delete['roll_no'].replace(' ', '_')}_card.pdf"
-        pdf_path = os.path.join(PDF_DIR, pdf_filename)
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
-        
-        save_data(data)
-        return True
-    return False
+    show_jobs()
 
 # PAGE: Add Student
 if page == "Add Student":
@@ -324,6 +295,18 @@ if page == "Add Student":
     else:
         st.info("Please upload a photo to enable cropping.")
 
+    # Preview drawn from the form as it is now; nothing is written to disk
+    st.markdown("---")
+    st.subheader("👁️ Card Preview")
+    preview_info = {
+        "name": name, "father_name": father_name, "roll_no": roll_no, "class": student_class,
+        "phone": phone, "gr_number": gr_number,
+        "date_of_birth": date_of_birth.isoformat(),
+        "date_of_issue": date_of_issue.isoformat(),
+        "date_of_expiry": date_of_expiry.isoformat(),
+    }
+    st.image(card_preview(preview_info, cropped_img), caption="Front and back")
+
     # Generate button
     st.markdown("---")
     if st.button("🎫 Add Student & Generate ID Card"):
@@ -331,19 +314,15 @@ if page == "Add Student":
             st.error("Please enter at least Student Name and Roll Number.")
         else:
             # Check for duplicate roll number
-            data = load_data()
-            if any(student['roll_no'] == roll_no for student in data):
+            if store.roll_exists(roll_no):
                 st.error("A student with this roll number already exists!")
             else:
                 img_path = None
                 if cropped_img:
-                    img_filename = f"{roll_no.replace(' ', '_')}.png"
-                    img_path = os.path.join(PHOTO_DIR, img_filename)
-                    Path(img_path).parent.mkdir(parents=True, exist_ok=True)
-                    cropped_img.save(img_path)
+                    # Card-resolution JPEG master + thumbnail instead of the full-size crop
+                    img_path = normalize_photo(cropped_img, roll_no)
 
                 student_info = {
-                    "id": len(data) + 1,
                     "name": name,
                     "father_name": father_name,
                     "roll_no": roll_no,
@@ -357,18 +336,21 @@ if page == "Add Student":
                     "created_at": datetime.now().isoformat()
                 }
 
-                data.append(student_info)
-                save_data(data)
-
-                pdf_file_path = generate_pdf(student_info, img_path)
-                st.success("✅ Student Added & ID Card Generated Successfully!")
-                
-                with open(pdf_file_path, "rb") as pdf_file:
+                try:
+                    # Sets student_info['id']; fails if another session just took the roll number
+                    store.insert(student_info)
+                except ConflictError as e:
+                    st.error(str(e))
+                else:
+                    pdf_file_path = generate_pdf(student_info, img_path)
+                    st.success("✅ Student Added & ID Card Generated Successfully!")
+                    
                     st.download_button(
                         "📥 Download ID Card PDF", 
-                        data=pdf_file, 
+                        data=partial(card_pdf_bytes, student_info), 
                         file_name=os.path.basename(pdf_file_path),
-                        mime="application/pdf"
+                        mime="application/pdf",
+                        on_click="ignore"
                     )
 
 # PAGE: Manage Students
@@ -387,25 +369,64 @@ elif page == "Manage Students":
         with col1:
             name_filter = st.text_input("Filter by Name", placeholder="Enter student name...")
         with col2:
-            class_filter = st.selectbox("Filter by Class", ["All"] + list(set([s['class'] for s in data if s['class']])))
+            class_filter = st.selectbox("Filter by Class", ["All"] + store.classes())
         with col3:
-            roll_filter = st.text_input("Filter by Roll Number", placeholder="Enter roll number...")
+            roll_filter = st.text_input("Filter by Roll / GR / Phone", placeholder="Enter roll, GR or phone number...")
         
-        # Apply filters
-        filtered_data = data
-        if name_filter:
-            filtered_data = [s for s in filtered_data if name_filter.lower() in s['name'].lower()]
-        if class_filter != "All":
-            filtered_data = [s for s in filtered_data if s['class'] == class_filter]
-        if roll_filter:
-            filtered_data = [s for s in filtered_data if roll_filter in s['roll_no']]
+        # Apply filters through the shared search index; close misspellings still match by name
+        filtered_data = store.search(
+            name=name_filter,
+            number=roll_filter,
+            class_name=None if class_filter == "All" else class_filter
+        )
         
         st.markdown("---")
         st.subheader(f"📋 Students List ({len(filtered_data)} students)")
         
+        # Sorting & pagination: only the visible page is rendered
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            sort_label = st.selectbox("Sort by", list(SORT_KEYS))
+        with col2:
+            page_size = st.selectbox("Students per page", PAGE_SIZE_OPTIONS, index=1)
+        with col3:
+            page_count = max(1, -(-len(filtered_data) // page_size))
+            if st.session_state.get("manage_page", 1) > page_count:
+                st.session_state.manage_page = page_count
+            page_number = st.number_input("Page", min_value=1, max_value=page_count, key="manage_page")
+        
+        sort_field, sort_reverse = SORT_KEYS[sort_label]
+        if sort_field:
+            filtered_data = sorted(filtered_data, key=lambda s: s.get(sort_field) or "", reverse=sort_reverse)
+        page_start = (page_number - 1) * page_size
+        page_rows = filtered_data[page_start:page_start + page_size]
+        st.caption(f"Showing {page_start + 1 if page_rows else 0}–{page_start + len(page_rows)} of {len(filtered_data)}")
+        
         # Display students
-        for i, student in enumerate(filtered_data):
-            with st.expander(f"🎓 {student['name']} - Roll: {student['roll_no']} - Class: {student['class']}"):
+        for student in page_rows:
+            col_select, col_row = st.columns([1, 12])
+            
+            with col_select:
+                checkbox_key = f"select_{student['id']}"
+                if st.checkbox("Select", value=student['id'] in st.session_state.selected_students, key=checkbox_key):
+                    if student['id'] not in st.session_state.selected_students:
+                        st.session_state.selected_students.append(student['id'])
+                else:
+                    if student['id'] in st.session_state.selected_students:
+                        st.session_state.selected_students.remove(student['id'])
+            
+            with col_row:
+                row = st.expander(
+                    f"🎓 {student['name']} - Roll: {student['roll_no']} - Class: {student['class']}",
+                    key=f"row_{student['id']}",
+                    on_change="rerun"
+                )
+            
+            # Details, photo and actions are only built for an opened row
+            if not row.open:
+                continue
+            
+            with row:
                 col1, col2, col3 = st.columns([2, 2, 1])
                 
                 with col1:
@@ -421,60 +442,51 @@ elif page == "Manage Students":
                     st.write(f"**Card Expiry:** {datetime.fromisoformat(student['date_of_expiry']).strftime('%d %B, %Y')}")
                 
                 with col3:
-                    if student.get('photo_path') and os.path.exists(student['photo_path']):
-                        st.image(student['photo_path'], width=100)
+                    photo = ui_photo(student.get('photo_path'))
+                    if photo:
+                        st.image(photo, width=100)
+                
+                # Drawn in memory and cached by card content, without touching the PDF
+                st.image(card_preview(student, student.get('photo_path')), caption="Card preview")
                 
                 # Action buttons
-                col1, col2, col3, col4 = st.columns(4)
+                col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    pdf_filename = f"{student['roll_no'].replace(' ', '_')}_card.pdf"
-                    pdf_path = os.path.join(PDF_DIR, pdf_filename)
-                    if os.path.exists(pdf_path):
-                        with open(pdf_path, "rb") as pdf_file:
-                            st.download_button(
-                                "📥 Download PDF",
-                                data=pdf_file,
-                                file_name=pdf_filename,
-                                mime="application/pdf",
-                                key=f"download_{student['id']}"
-                            )
-                    else:
-                        if st.button("🔄 Regenerate PDF", key=f"regen_{student['id']}"):
-                            pdf_path = generate_pdf(student, student.get('photo_path'))
-                            st.success("PDF regenerated successfully!")
-                            st.rerun()
+                    # The card is read (and rendered if missing or stale) only when clicked
+                    st.download_button(
+                        "📥 Download PDF",
+                        data=partial(card_pdf_bytes, student),
+                        file_name=os.path.basename(pdf_path_for(student)),
+                        mime="application/pdf",
+                        on_click="ignore",
+                        key=f"download_{student['id']}"
+                    )
                 
                 with col2:
                     if st.button("✏️ Edit", key=f"edit_{student['id']}"):
                         st.session_state.edit_mode = True
                         st.session_state.edit_student_id = student['id']
+                        st.session_state.edit_base = dict(student)
                         st.rerun()
                 
                 with col3:
                     if st.button("🗑️ Delete", key=f"delete_{student['id']}", type="secondary"):
-                        if delete_student(student['id']):
+                        if delete_student(store, student['id']):
                             st.success("Student deleted successfully!")
                             st.rerun()
                         else:
                             st.error("Failed to delete student!")
-                
-                with col4:
-                    checkbox_key = f"select_{student['id']}"
-                    if st.checkbox("Select", key=checkbox_key):
-                        if student['id'] not in st.session_state.selected_students:
-                            st.session_state.selected_students.append(student['id'])
-                    else:
-                        if student['id'] in st.session_state.selected_students:
-                            st.session_state.selected_students.remove(student['id'])
 
         # Edit Mode
         if st.session_state.edit_mode and st.session_state.edit_student_id:
             st.markdown("---")
             st.subheader("✏️ Edit Student")
+            if st.session_state.get('conflict_message'):
+                st.warning(st.session_state.pop('conflict_message'))
             
-            # Find student to edit
-            student_to_edit = next((s for s in data if s['id'] == st.session_state.edit_student_id), None)
+            # Find student to edit; the form shows the record as it was when editing started
+            student_to_edit = st.session_state.edit_base if store.get(st.session_state.edit_student_id) else None
             
             if student_to_edit:
                 with st.form("edit_student_form"):
@@ -500,29 +512,33 @@ elif page == "Manage Students":
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.form_submit_button("💾 Save Changes"):
-                            # Update student data
-                            for i, student in enumerate(data):
-                                if student['id'] == st.session_state.edit_student_id:
-                                    data[i].update({
-                                        'name': edit_name,
-                                        'father_name': edit_father_name,
-                                        'roll_no': edit_roll_no,
-                                        'class': edit_class,
-                                        'phone': edit_phone,
-                                        'gr_number': edit_gr_number,
-                                        'date_of_birth': edit_dob.isoformat(),
-                                        'date_of_issue': edit_issue.isoformat(),
-                                        'date_of_expiry': edit_expiry.isoformat(),
-                                        'updated_at': datetime.now().isoformat()
-                                    })
-                                    break
+                            # Update student data unless someone else changed it meanwhile
+                            try:
+                                store.update(st.session_state.edit_student_id, {
+                                    'name': edit_name,
+                                    'father_name': edit_father_name,
+                                    'roll_no': edit_roll_no,
+                                    'class': edit_class,
+                                    'phone': edit_phone,
+                                    'gr_number': edit_gr_number,
+                                    'date_of_birth': edit_dob.isoformat(),
+                                    'date_of_issue': edit_issue.isoformat(),
+                                    'date_of_expiry': edit_expiry.isoformat(),
+                                    'updated_at': datetime.now().isoformat()
+                                }, expected=student_to_edit)
+                            except ConflictError as e:
+                                # Show their version; the clerk re-applies their edit and saves again
+                                st.session_state.edit_base = store.get(st.session_state.edit_student_id)
+                                st.session_state.conflict_message = f"{e} Their version is shown below; make your changes again."
+                                st.rerun()
                             
-                            save_data(data)
-                            # Regenerate PDF
-                            generate_pdf(data[i], data[i].get('photo_path'))
+                            # Regenerate PDF (skipped when no printed field changed)
+                            updated_student = store.get(st.session_state.edit_student_id)
+                            ensure_pdf(updated_student, updated_student.get('photo_path'))
                             
                             st.session_state.edit_mode = False
                             st.session_state.edit_student_id = None
+                            st.session_state.edit_base = None
                             st.success("Student updated successfully!")
                             st.rerun()
                     
@@ -530,12 +546,15 @@ elif page == "Manage Students":
                         if st.form_submit_button("❌ Cancel"):
                             st.session_state.edit_mode = False
                             st.session_state.edit_student_id = None
+                            st.session_state.edit_base = None
                             st.rerun()
 
 # PAGE: Bulk Operations
 elif page == "Bulk Operations":
     st.header("📦 Bulk Operations")
     
+    job_panel(["cards", "sheets", "photos"])
+    
     data = load_data()
     selected_count = len(st.session_state.selected_students)
     
@@ -546,35 +565,26 @@ elif page == "Bulk Operations":
         
         with col1:
             if st.button("📥 Download Selected PDFs", type="primary"):
-                # Create ZIP file with selected PDFs
-                zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                # Create ZIP file with selected PDFs, written straight to disk
+                with ZipSpool() as zip_file:
                     for student_id in st.session_state.selected_students:
-                        student = next((s for s in data if s['id'] == student_id), None)
+                        student = store.get(student_id)
                         if student:
-                            pdf_filename = f"{student['roll_no'].replace(' ', '_')}_card.pdf"
-                            pdf_path = os.path.join(PDF_DIR, pdf_filename)
-                            if os.path.exists(pdf_path):
-                                zip_file.write(pdf_path, pdf_filename)
-                            else:
-                                # Generate PDF if it doesn't exist
-                                pdf_path = generate_pdf(student, student.get('photo_path'))
-                                zip_file.write(pdf_path, pdf_filename)
+                            # Generate PDF if it doesn't exist or is out of date
+                            pdf_path, _ = ensure_pdf(student, student.get('photo_path'))
+                            zip_file.add(pdf_path)
                 
-                zip_buffer.seek(0)
-                st.download_button(
-                    "📥 Download ZIP",
-                    data=zip_buffer.getvalue(),
-                    file_name=f"selected_id_cards_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                    mime="application/zip"
+                st.session_state.downloads.put(
+                    "selected_zip",
+                    zip_file.path,
+                    f"selected_id_cards_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
                 )
+            
+            spooled_download_button("selected_zip", "📥 Download ZIP", "application/zip")
         
         with col3:
             if st.button("🗑️ Delete Selected", type="secondary"):
-                deleted_count = 0
-                for student_id in st.session_state.selected_students.copy():
-                    if delete_student(student_id):
-                        deleted_count += 1
+                deleted_count = delete_students(store, st.session_state.selected_students)
                 st.session_state.selected_students = []
                 st.success(f"Deleted {deleted_count} student(s) successfully!")
                 st.rerun()
@@ -584,41 +594,80 @@ elif page == "Bulk Operations":
     st.markdown("---")
     st.subheader("📄 Generate All PDFs")
     
+    workers = st.number_input(
+        "Parallel workers",
+        min_value=1,
+        max_value=max(os.cpu_count() or 1, PDF_WORKERS),
+        value=PDF_WORKERS,
+        help="Number of processes used to render ID cards. Use 1 to render in this session only."
+    )
+    
     if st.button("🎫 Generate All ID Cards"):
         if data:
-            progress_bar = st.progress(0)
-            success_count = 0
-            
-            # Temporary in-memory ZIP file
-            zip_buffer = BytesIO()
-
-            with zipfile.ZipFile(zip_buffer, "w") as zipf:
-                for i, student in enumerate(data):
-                    try:
-                        # Generate PDF file path
-                        pdf_path = generate_pdf(student, student.get('photo_path'))
-
-                        # Add PDF to zip
-                        zipf.write(pdf_path, arcname=os.path.basename(pdf_path))
-                        success_count += 1
-                    except Exception as e:
-                        st.error(f"❌ Failed to generate PDF for {student['name']}: {str(e)}")
-                    
-                    progress_bar.progress((i + 1) / len(data))
-
-            st.success(f"✅ Generated {success_count} out of {len(data)} ID cards successfully!")
+            # Runs in the background; the ZIP appears under Background Jobs when done
+            job_runner.submit("cards", f"All ID cards ({len(data)})", generate_cards_task, data, int(workers))
+            st.rerun()
+        else:
+            st.info("ℹ️ No students found to generate PDFs for.")
 
-            # Prepare ZIP file for download
-            zip_buffer.seek(0)
-            st.download_button(
-                label="⬇️ Download All PDFs as ZIP",
-                data=zip_buffer,
-                file_name="All_ID_Cards.zip",
-                mime="application/zip"
+    # Print-ready sheets
+    st.markdown("---")
+    st.subheader("🖨️ Print Sheets")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sheet_scope = st.selectbox("Cards to print", ["All students", "Selected students", "Class"])
+    with col2:
+        sheet_class = st.selectbox(
+            "Class",
+            store.classes(),
+            disabled=sheet_scope != "Class"
+        )
+    with col3:
+        sheet_size = st.selectbox("Paper size", list(PAGE_SIZES))
+    
+    columns, rows, _ = sheet_layout(sheet_size)
+    st.caption(f"{columns * rows} cards per sheet. Fronts and backs alternate sheets for duplex printing (flip on long edge).")
+    
+    if st.button("🖨️ Build Print Sheets"):
+        if sheet_scope == "Selected students":
+            sheet_students = [s for s in (store.get(i) for i in st.session_state.selected_students) if s]
+        elif sheet_scope == "Class":
+            sheet_students = store.search(class_name=sheet_class)
+        else:
+            sheet_students = data
+        
+        if sheet_students:
+            job_runner.submit(
+                "sheets",
+                f"Print sheets, {sheet_size} ({len(sheet_students)} cards)",
+                print_sheets_task, sheet_students, sheet_size
             )
-
+            st.rerun()
         else:
-            st.info("ℹ️ No students found to generate PDFs for.")
+            st.info("ℹ️ No students to print.")
+
+    # Photo maintenance
+    st.markdown("---")
+    st.subheader("🖼️ Photos")
+    st.caption("Convert older full-resolution photos to compact card-resolution JPEGs with thumbnails.")
+    
+    if st.button("🔄 Re-normalize Existing Photos"):
+        job_runner.submit("photos", f"Re-normalize photos ({len(data)} students)", renormalize_task, store, data)
+        st.rerun()
+    
+    # Bulk photos: one ZIP with files named by roll or GR number, e.g. R-0001.jpg
+    photo_zip = st.file_uploader(
+        "Upload a ZIP of photos",
+        type=["zip"],
+        help="Each photo is named by the student's roll number or GR number (any folder, JPEG/PNG/WebP). Photos are cropped square and resized in parallel, using the workers set above."
+    )
+    if photo_zip and st.button("📦 Import Photos"):
+        upload_path = spool_path(".zip")
+        with open(upload_path, "wb") as f:
+            f.write(photo_zip.getbuffer())
+        job_runner.submit("photos", f"Import photos from {photo_zip.name}", photo_zip_task, store, upload_path, int(workers))
+        st.rerun()
 
 # PAGE: Import/Export
 elif page == "Import/Export":
@@ -629,37 +678,58 @@ elif page == "Import/Export":
     data = load_data()
     
     if data:
-        # Convert to DataFrame for export
-        df = pd.DataFrame(data)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Export to Excel
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Students', index=False)
-            excel_buffer.seek(0)
-            
-            st.download_button(
-                "📥 Export to Excel",
-                data=excel_buffer.getvalue(),
-                file_name=f"students_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-        
-        with col2:
-            # Export to CSV
-            csv_buffer = df.to_csv(index=False)
-            st.download_button(
-                "📥 Export to CSV",
-                data=csv_buffer,
-                file_name=f"students_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+        # Nothing is built until a button is clicked; the file is then cached for this data version
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        export_labels = {"xlsx": "📥 Export to Excel", "csv": "📥 Export to CSV", "parquet": "📥 Export to Parquet"}
+        for col, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+            with col:
+                st.download_button(
+                    export_labels[fmt],
+                    data=partial(export_bytes, store, fmt),
+                    file_name=f"students_data_{stamp}.{fmt}",
+                    mime=MIME_TYPES[fmt],
+                    on_click="ignore",
+                    key=f"export_{fmt}"
+                )
     else:
         st.info("No data to export.")
     
+    # Changes only, for systems that keep their own copy (exam office, transport)
+    st.markdown("---")
+    st.subheader("🔄 Export Changes")
+    if not store.storage.tracks_changes:
+        st.caption("This storage backend does not record changes, so every export holds all students.")
+    since_text = st.text_input(
+        "Changed since",
+        placeholder="Sync token from the last export, or a date/time such as 2026-10-16 08:00",
+        help="Leave empty to export everything and get a first sync token. Deleted students are listed with change = delete."
+    )
+    if st.button("🔍 Find Changes"):
+        try:
+            since = parse_since(since_text)
+            st.session_state.changes_export = (since, store.changes_since(since))
+        except ValueError as e:
+            st.error(str(e))
+    
+    if st.session_state.changes_export:
+        since, changes = st.session_state.changes_export
+        if changes["full"]:
+            st.info(f"Full export of {len(changes['students'])} students: replace the previous copy.")
+        else:
+            st.info(f"{len(changes['students'])} students added or changed, {len(changes['deleted'])} deleted.")
+        if changes["token"] is not None:
+            st.write(f"Sync token for the next export: **{changes['token']}**")
+        for col, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+            with col:
+                st.download_button(
+                    f"📥 Changes as {fmt.upper()}",
+                    data=partial(changes_bytes, changes, fmt),
+                    file_name=changes_file_name(changes, since, fmt),
+                    mime=MIME_TYPES[fmt],
+                    on_click="ignore",
+                    key=f"changes_{fmt}"
+                )
+    
     # Import Section
     st.markdown("---")
     st.subheader("📤 Import Data")
@@ -669,107 +739,80 @@ elif page == "Import/Export":
         type=['xlsx', 'xls', 'csv'],
         help="Upload a file with student data. Required columns: name, father_name, roll_no, class, phone, gr_number, date_of_birth, date_of_issue, date_of_expiry"
     )
+    stream_upload = st.checkbox(
+        "Large file: import in batches",
+        help="Reads the file in chunks and commits each batch as it goes. Rows that fail validation are skipped and listed in a downloadable report instead of stopping the import."
+    )
     
     if uploaded_file:
         try:
-            # Read the file
-            if uploaded_file.name.endswith('.csv'):
-                import_df = pd.read_csv(uploaded_file)
+            # Read the file (only the first rows when streaming)
+            if stream_upload:
+                import_df, _ = next(read_chunks(uploaded_file, uploaded_file.name, chunk_size=5))
+                uploaded_file.seek(0)
             else:
-                import_df = pd.read_excel(uploaded_file)
+                import_df = read_sheet(uploaded_file, uploaded_file.name)
             
             st.write("Preview of imported data:")
             st.dataframe(import_df.head())
             
             # Validate required columns
-            required_columns = ['name', 'father_name', 'roll_no', 'class', 'phone', 'gr_number', 'date_of_birth', 'date_of_issue', 'date_of_expiry', 'photo_path']
-            missing_columns = [col for col in required_columns if col not in import_df.columns]
+            missing = missing_columns(import_df)
             
-            if missing_columns:
-                st.error(f"Missing required columns: {', '.join(missing_columns)}")
+            if missing:
+                st.error(f"Missing required columns: {', '.join(missing)}")
             else:
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    import_mode = st.radio(
-                        "Import Mode",
-                        ["Add new students only", "Replace all data", "Update existing + add new"]
-                    )
+                    import_mode = st.radio("Import Mode", IMPORT_MODES)
                 
                 with col2:
                     if st.button("🔄 Import Data", type="primary"):
                         try:
-                            current_data = load_data()
+                            if stream_upload:
+                                # Validate and commit chunk by chunk in the background; bad rows go to a report
+                                upload_path = spool_path(os.path.splitext(uploaded_file.name)[1])
+                                with open(upload_path, "wb") as f:
+                                    f.write(uploaded_file.getbuffer())
+                                job_runner.submit(
+                                    "import",
+                                    f"Import {uploaded_file.name} ({import_mode.lower()})",
+                                    import_task, store, upload_path, uploaded_file.name, import_mode
+                                )
+                                st.info("Import queued. Progress and the rejected-rows report appear below.")
                             
-                            if import_mode == "Replace all data":
-                                # Clear existing data and files
-                                if os.path.exists(PHOTO_DIR):
-                                    shutil.rmtree(PHOTO_DIR)
-                                if os.path.exists(PDF_DIR):
-                                    shutil.rmtree(PDF_DIR)
-                                os.makedirs(PHOTO_DIR, exist_ok=True)
-                                os.makedirs(PDF_DIR, exist_ok=True)
-                                new_data = []
                             else:
-                                new_data = current_data.copy()
-                            
-                            imported_count = 0
-                            updated_count = 0
-                            
-                            for _, row in import_df.iterrows():
-                                student_data = {
-                                    'id': len(new_data) + 1,
-                                    'name': str(row['name']),
-                                    'father_name': str(row['father_name']),
-                                    'roll_no': str(row['roll_no']),
-                                    'class': str(row['class']),
-                                    'phone': str(row['phone']),
-                                    'gr_number': str(row['gr_number']),
-                                    'date_of_birth': pd.to_datetime(row['date_of_birth']).date().isoformat(),
-                                    'date_of_issue': pd.to_datetime(row['date_of_issue']).date().isoformat(),
-                                    'date_of_expiry': pd.to_datetime(row['date_of_expiry']).date().isoformat(),
-                                    'photo_path': str(row['photo_path']) if 'photo_path' in row and pd.notna(row['photo_path']) else None,
-                                    'created_at': datetime.now().isoformat()
-                                }
+                                # Parse columns once and merge on roll_no before touching any files;
+                                # the save is refused if another session changed the data meanwhile
+                                version, current = store.load_versioned()
+                                new_data, changed, imported_count, updated_count = merge_import(current, import_df, import_mode)
+                                
+                                if import_mode == REPLACE_ALL:
+                                    save_data(new_data, expected_version=version)
+                                    clear_student_files()
+                                elif changed:
+                                    store.upsert_many(changed, expected_version=version)
                                 
-                                if import_mode == "Update existing + add new":
-                                    # Check if student exists (by roll number)
-                                    existing_idx = next((i for i, s in enumerate(new_data) if s['roll_no'] == student_data['roll_no']), None)
-                                    if existing_idx is not None:
-                                        # Update existing student
-                                        student_data['id'] = new_data[existing_idx]['id']
-                                        student_data['photo_path'] = new_data[existing_idx].get('photo_path')
-                                        student_data['updated_at'] = datetime.now().isoformat()
-                                        new_data[existing_idx] = student_data
-                                        updated_count += 1
-                                    else:
-                                        # Add new student
-                                        new_data.append(student_data)
-                                        imported_count += 1
+                                # Show results
+                                if import_mode == REPLACE_ALL:
+                                    st.success(f"Data replaced successfully! Imported {len(import_df)} students.")
+                                elif import_mode == UPSERT:
+                                    st.success(f"Import completed! Added {imported_count} new students, updated {updated_count} existing students.")
                                 else:
-                                    # Add new students only
-                                    if not any(s['roll_no'] == student_data['roll_no'] for s in new_data):
-                                        new_data.append(student_data)
-                                        imported_count += 1
-                            
-                            save_data(new_data)
-                            
-                            # Show results
-                            if import_mode == "Replace all data":
-                                st.success(f"Data replaced successfully! Imported {len(import_df)} students.")
-                            elif import_mode == "Update existing + add new":
-                                st.success(f"Import completed! Added {imported_count} new students, updated {updated_count} existing students.")
-                            else:
-                                st.success(f"Import completed! Added {imported_count} new students (skipped {len(import_df) - imported_count} duplicates).")
-                            
-                            st.rerun()
+                                    st.success(f"Import completed! Added {imported_count} new students (skipped {len(import_df) - imported_count} duplicates).")
+                                
+                                st.rerun()
                             
                         except Exception as e:
                             st.error(f"Error importing data: {str(e)}")
+
         
         except Exception as e:
             st.error(f"Error reading file: {str(e)}")
     
+    job_panel(["import"])
+    
 
 
 # Sidebar Statistics
@@ -809,6 +852,18 @@ if st.session_state.selected_students:
         st.session_state.selected_students = []
         st.rerun()
 
+# Hot-path metrics (IDCARD_METRICS=1); this rerun's own time is recorded up to here
+if metrics.enabled():
+    rerun_seconds = time.perf_counter() - rerun_started
+    metrics.observe("rerun_seconds", rerun_seconds, page=page)
+    with st.sidebar.expander("🛠️ Metrics"):
+        st.caption(f"Last rerun: {rerun_seconds * 1000:.0f} ms")
+        st.dataframe(metrics.summary(), hide_index=True)
+        if st.button("Reset metrics"):
+            metrics.reset()
+            st.rerun()
+    metrics.write()
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import METRICS_ENABLED, METRICS_FILE
+
+
+# Latency buckets in seconds, Prometheus-style upper bounds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREFIX = "idcard_"
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., overflow, count, sum, max]
+_enabled = METRICS_ENABLED
+
+
+# ------------------ RECORDING ------------------
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0, 0.0, 0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(BUCKETS)] += 1
+        hist[-3] += 1
+        hist[-2] += seconds
+        hist[-1] = max(hist[-1], seconds)
+
+@contextmanager
+def timed(name, **labels):
+    """Time the block (or decorated function) into the name histogram; free when disabled."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+# ------------------ SNAPSHOTS ------------------
+def snapshot():
+    with _lock:
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, dict(labels), list(hist)] for (name, labels), hist in _histograms.items()],
+        }
+
+def merge(data):
+    """Add a snapshot taken in another process (e.g. a PDF worker) into this registry."""
+    with _lock:
+        for name, labels, value in data["counters"]:
+            key = _key(name, labels)
+            _counters[key] = _counters.get(key, 0) + value
+        for name, labels, other in data["histograms"]:
+            key = _key(name, labels)
+            hist = _histograms.get(key)
+            if hist is None:
+                _histograms[key] = list(other)
+                continue
+            for i in range(len(hist) - 1):
+                hist[i] += other[i]
+            hist[-1] = max(hist[-1], other[-1])
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _quantile(hist, q):
+    total = hist[-3]
+    seen = 0
+    for i, bound in enumerate(BUCKETS):
+        seen += hist[i]
+        if seen >= q * total:
+            return min(bound, hist[-1])
+    return hist[-1]
+
+def summary():
+    """Rows for display: one per counter and one per histogram series."""
+    data = snapshot()
+    rows = []
+    for name, labels, hist in sorted(data["histograms"], key=lambda h: (h[0], sorted(h[1].items()))):
+        count_ = hist[-3]
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels.items()),
+            "count": count_,
+            "total_s": round(hist[-2], 3),
+            "mean_ms": round(hist[-2] / count_ * 1000, 2) if count_ else None,
+            "p95_ms": round(_quantile(hist, 0.95) * 1000, 2) if count_ else None,
+            "max_ms": round(hist[-1] * 1000, 2),
+        })
+    for name, labels, value in sorted(data["counters"], key=lambda c: (c[0], sorted(c[1].items()))):
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels.items()),
+            "count": value,
+        })
+    return rows
+
+
+# ------------------ EXPORT ------------------
+def _label_text(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+def render_prometheus():
+    data = snapshot()
+    lines = []
+    for name in sorted({c[0] for c in data["counters"]}):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        for _, labels, value in (c for c in data["counters"] if c[0] == name):
+            lines.append(f"{PREFIX}{name}{_label_text(labels)} {value}")
+    for name in sorted({h[0] for h in data["histograms"]}):
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for _, labels, hist in (h for h in data["histograms"] if h[0] == name):
+            cumulative = 0
+            for i, bound in enumerate(BUCKETS):
+                cumulative += hist[i]
+                lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, le=bound)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, le='+Inf')} {hist[-3]}")
+            lines.append(f"{PREFIX}{name}_sum{_label_text(labels)} {hist[-2]}")
+            lines.append(f"{PREFIX}{name}_count{_label_text(labels)} {hist[-3]}")
+    return "\n".join(lines) + "\n"
+
+def write(path=METRICS_FILE):
+    """Write the registry to path: Prometheus text (replaced atomically), or
+    one appended JSON line per call when the path ends in .jsonl."""
+    if not _enabled or not path:
+        return
+    if path.endswith(".jsonl"):
+        with open(path, "a") as f:
+            f.write(json.dumps({"time": datetime.now().isoformat(), **snapshot()}) + "\n")
+        return
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
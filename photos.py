@@ -0,0 +1,173 @@
+import io
+import os
+import zipfile
+from functools import partial
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import PDF_WORKERS, PHOTO_DIR, PHOTO_DPI
+from pools import run_chunked
+
+
+PHOTO_SIZE_PT = 103  # diameter of the photo circle on the card
+PHOTO_PX = round(PHOTO_SIZE_PT / 72 * PHOTO_DPI)
+THUMB_PX = 128
+THUMB_DIR = os.path.join(PHOTO_DIR, "thumbs")
+JPEG_QUALITY = 88
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+
+# ------------------ PATHS ------------------
+def photo_path_for(roll_no):
+    return os.path.join(PHOTO_DIR, f"{str(roll_no).replace(' ', '_')}.jpg")
+
+def thumbnail_path_for(photo_path):
+    name = os.path.splitext(os.path.basename(photo_path))[0]
+    return os.path.join(THUMB_DIR, f"{name}.jpg")
+
+
+# ------------------ NORMALIZATION ------------------
+def _to_rgb(img):
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+def _square(img):
+    side = min(img.size)
+    left = (img.width - side) // 2
+    top = (img.height - side) // 2
+    return img.crop((left, top, left + side, top + side))
+
+def normalize_photo(img, roll_no):
+    """Store a card-resolution JPEG master and a UI thumbnail; returns the master path.
+
+    The master is square, RGB and sized for the printed circle at PHOTO_DPI,
+    so ReportLab can embed the JPEG as-is instead of decoding a full-size PNG."""
+    # JPEGs not decoded yet are decoded at the smallest scale still covering the master
+    img.draft("RGB", (PHOTO_PX, PHOTO_PX))
+    img = _square(_to_rgb(img))
+    if img.width > PHOTO_PX:
+        img = img.resize((PHOTO_PX, PHOTO_PX), Image.LANCZOS)
+
+    photo_path = photo_path_for(roll_no)
+    os.makedirs(PHOTO_DIR, exist_ok=True)
+    img.save(photo_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    thumb = img.copy()
+    thumb.thumbnail((THUMB_PX, THUMB_PX), Image.LANCZOS)
+    thumb.save(thumbnail_path_for(photo_path), "JPEG", quality=80)
+    return photo_path
+
+def is_normalized(photo_path):
+    if not photo_path or not photo_path.lower().endswith(".jpg") or not os.path.exists(photo_path):
+        return False
+    if not os.path.exists(thumbnail_path_for(photo_path)):
+        return False
+    with Image.open(photo_path) as img:  # header only, no pixel decode
+        return img.mode == "RGB" and img.width == img.height and img.width <= PHOTO_PX
+
+def ui_photo(photo_path):
+    """Thumbnail for list views, falling back to the stored photo."""
+    if not photo_path:
+        return None
+    thumb = thumbnail_path_for(photo_path)
+    if os.path.exists(thumb):
+        return thumb
+    return photo_path if os.path.exists(photo_path) else None
+
+
+# ------------------ BULK RE-NORMALIZE ------------------
+def renormalize_photos(students, on_progress=None):
+    """Normalize every existing photo that is not already a card-resolution master.
+
+    Returns ({student_id: new_photo_path}, [(student, error)]). The old photos are
+    left in place; remove them once the new paths are saved."""
+    students = list(students)
+    updates, errors = {}, []
+    for i, student in enumerate(students):
+        photo_path = student.get('photo_path')
+        if photo_path and os.path.exists(photo_path) and not is_normalized(photo_path):
+            try:
+                with Image.open(photo_path) as img:
+                    new_path = normalize_photo(img, student['roll_no'])
+                if os.path.abspath(new_path) != os.path.abspath(photo_path):
+                    updates[student['id']] = new_path
+            except Exception as e:
+                errors.append((student, str(e)))
+        if on_progress:
+            on_progress(i + 1, len(students))
+    return updates, errors
+
+
+# ------------------ ZIP IMPORT ------------------
+def photo_key(value):
+    """A roll or GR number as it is matched against photo file names."""
+    return str(value or "").strip().upper().replace(" ", "_")
+
+def zip_photo_names(zip_file):
+    """Image members of an open ZipFile, in any folder; skips macOS metadata and hidden files."""
+    for info in zip_file.infolist():
+        base = os.path.basename(info.filename)
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+            continue
+        if os.path.splitext(base)[1].lower() in PHOTO_EXTENSIONS:
+            yield info.filename
+
+def match_photos(names, students):
+    """Match file names (without extension) to students: roll number first, then GR number.
+
+    Returns ({name: student}, [(name, reason)]) for the matched and the unmatched files."""
+    by_roll, by_gr = {}, {}
+    for student in students:
+        if student.get('roll_no'):
+            by_roll.setdefault(photo_key(student['roll_no']), student)
+        if student.get('gr_number'):
+            by_gr.setdefault(photo_key(student['gr_number']), student)
+
+    matched, unmatched, taken = {}, [], {}
+    for name in names:
+        key = photo_key(os.path.splitext(os.path.basename(name))[0])
+        student = by_roll.get(key) or by_gr.get(key)
+        if student is None:
+            unmatched.append((name, "no student with this roll or GR number"))
+        elif student['id'] in taken:
+            unmatched.append((name, f"roll {student['roll_no']} already has {taken[student['id']]}"))
+        else:
+            taken[student['id']] = name
+            matched[name] = student
+    return matched, unmatched
+
+def _normalize_members(zip_path, members):
+    # Worker: opens the archive once per chunk and decodes only its own members
+    results = []
+    with zipfile.ZipFile(zip_path) as zip_file:
+        for name, roll_no in members:
+            try:
+                with Image.open(io.BytesIO(zip_file.read(name))) as img:
+                    results.append((name, normalize_photo(img, roll_no), None))
+            except UnidentifiedImageError:
+                results.append((name, None, "not a readable image"))
+            except Exception as e:
+                results.append((name, None, str(e)))
+    return results
+
+def normalize_zip_photos(zip_path, matched, workers=PDF_WORKERS, chunk_size=16):
+    """Normalize the matched members across a process pool, yielding
+    (name, photo_path, error) as they finish. Photos are named by roll number."""
+    members = [(name, student['roll_no']) for name, student in matched.items()]
+    workers = max(1, min(workers or 1, len(members) or 1))
+    if workers == 1:
+        for member in members:
+            yield from _normalize_members(zip_path, [member])
+        return
+
+    chunks = [members[i:i + chunk_size] for i in range(0, len(members), chunk_size)]
+    for chunk, results, error in run_chunked(partial(_normalize_members, zip_path), chunks, workers):
+        if error is not None:
+            results = [(name, None, error) for name, _ in chunk]
+        yield from results
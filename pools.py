@@ -0,0 +1,21 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# ------------------ PROCESS POOL ------------------
+def run_chunked(fn, chunks, workers):
+    """Call fn(chunk) for every chunk across a process pool, yielding
+    (chunk, result, error) as they finish; error is None or the message of what fn raised."""
+    # spawn rather than fork: the Streamlit server is multi-threaded
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(fn, chunk): chunk for chunk in chunks}
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, str(e)
+        finally:
+            # Consumer stopped early (e.g. a cancelled job): drop chunks not yet started
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,170 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont, features
+import reportlab
+
+from config import CARD_WIDTH, CARD_HEIGHT
+from cards import BACK_BG_PATH, FRONT_BG_PATH, card_hash, int_to_roman
+from qrcodes import QR_BORDER, encode_payload, qr_runs
+import metrics
+
+
+# Same layout as cards.draw_front/draw_back, drawn with Pillow at screen resolution
+PREVIEW_SCALE = 1.5      # pixels per PDF point (108 dpi)
+PREVIEW_GAP = 8          # points between the front and the back
+PREVIEW_FORMAT = "webp" if features.check("webp") else "png"
+PREVIEW_CACHE_SIZE = 256
+# Bump whenever the drawing below changes so cached previews are redrawn
+PREVIEW_VERSION = 1
+
+NAVY = "#231f55"
+# Vera ships with ReportLab and is close to the Helvetica used in the PDF
+FONT_DIR = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+
+
+# ------------------ DRAWING HELPERS ------------------
+def _px(value):
+    return round(value * PREVIEW_SCALE)
+
+def _point(x, y):
+    # PDF coordinates start at the bottom left, images at the top left
+    return _px(x), _px(CARD_HEIGHT - y)
+
+@lru_cache(maxsize=16)
+def _font(bold, size):
+    name = "VeraBd.ttf" if bold else "Vera.ttf"
+    try:
+        return ImageFont.truetype(os.path.join(FONT_DIR, name), _px(size))
+    except OSError:
+        return ImageFont.load_default(_px(size))
+
+_backgrounds = {}
+
+def _background(path):
+    """Template image scaled to the card once per file version; white if missing."""
+    size = (_px(CARD_WIDTH), _px(CARD_HEIGHT))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return Image.new("RGB", size, "white")
+    key = (path, stat.st_mtime_ns, stat.st_size, size)
+    if key not in _backgrounds:
+        with Image.open(path) as img:
+            _backgrounds[key] = img.convert("RGB").resize(size, Image.LANCZOS)
+    return _backgrounds[key].copy()
+
+@lru_cache(maxsize=4)
+def _circle_mask(size):
+    # Drawn 4x larger and scaled down for a smooth edge
+    mask = Image.new("L", (size * 4, size * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size * 4 - 1, size * 4 - 1), fill=255)
+    return mask.resize((size, size), Image.LANCZOS)
+
+def _photo(photo, size):
+    if isinstance(photo, Image.Image):
+        return photo.convert("RGB").resize((size, size), Image.LANCZOS)
+    with Image.open(photo) as img:
+        img.draft("RGB", (size, size))  # JPEG: decode at reduced size
+        # Stretched to the square like drawImage does
+        return img.convert("RGB").resize((size, size), Image.LANCZOS)
+
+def _date(value):
+    return datetime.fromisoformat(value).strftime("%d %B, %Y") if value else ""
+
+
+# ------------------ SIDES ------------------
+def draw_front(info, photo):
+    img = _background(FRONT_BG_PATH)
+    draw = ImageDraw.Draw(img)
+    bold = _font(True, 9)
+    draw.text(_point(94.5, 140), str(info.get('name') or "").upper(), fill=NAVY, font=bold, anchor="ms")
+    draw.text(_point(94.5, 113), str(info.get('father_name') or "").upper(), fill=NAVY, font=bold, anchor="ms")
+    draw.text(_point(90.5, 95), "Level-" + int_to_roman(info.get('class')), fill="white", font=bold, anchor="ms")
+
+    regular = _font(False, 9)
+    draw.text(_point(65, 67), str(info.get('roll_no') or ""), fill=NAVY, font=regular, anchor="ls")
+    draw.text(_point(65, 52), str(info.get('gr_number') or ""), fill=NAVY, font=regular, anchor="ls")
+    draw.text(_point(65, 37), _date(info.get('date_of_birth')), fill=NAVY, font=regular, anchor="ls")
+
+    if photo is not None:
+        size = _px(103)
+        img.paste(photo, _point(CARD_WIDTH - 149, CARD_HEIGHT - 161.5 + 103), _circle_mask(size))
+    return img
+
+def draw_back(info):
+    img = _background(BACK_BG_PATH)
+    draw = ImageDraw.Draw(img)
+
+    # QR: the 80pt square at (50, 125), quiet zone included
+    count, runs = qr_runs(encode_payload(info))
+    module = 80 / (count + 2 * QR_BORDER)
+    left, top = 50 + QR_BORDER * module, 125 + 80 - QR_BORDER * module
+    for r, col, length in runs:
+        x0, y0 = _point(left + col * module, top - r * module)
+        x1, y1 = _point(left + (col + length) * module, top - (r + 1) * module)
+        draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill="black")
+
+    bold = _font(True, 8)
+    draw.text(_point(95, 104), _date(info.get('date_of_issue')), fill=NAVY, font=bold, anchor="ls")
+    draw.text(_point(95, 93), _date(info.get('date_of_expiry')), fill=NAVY, font=bold, anchor="ls")
+    draw.text(_point(85.5, 62.5), str(info.get('phone') or ""), fill="white", font=_font(True, 8.5), anchor="ls")
+    return img
+
+def render_preview(info, photo=None):
+    """Front and back side by side as one image. photo is a path or a PIL image."""
+    size = _px(103)
+    if isinstance(photo, (str, os.PathLike)):
+        photo = _photo(photo, size) if os.path.exists(photo) else None
+    elif photo is not None:
+        photo = _photo(photo, size)
+    width, height, gap = _px(CARD_WIDTH), _px(CARD_HEIGHT), _px(PREVIEW_GAP)
+    img = Image.new("RGB", (width * 2 + gap, height), "white")
+    img.paste(draw_front(info, photo), (0, 0))
+    img.paste(draw_back(info), (width + gap, 0))
+    return img
+
+
+# ------------------ CACHE ------------------
+_cache = OrderedDict()  # preview key -> encoded bytes, least recently used first
+_cache_lock = threading.Lock()
+
+def preview_key(info, photo=None, fmt=PREVIEW_FORMAT):
+    """Card content hash (fields, QR, photo, templates) plus the preview settings."""
+    if isinstance(photo, Image.Image):
+        # A crop not saved yet: hash the pixels at the size they are drawn
+        digest = hashlib.sha256(_photo(photo, _px(103)).tobytes()).hexdigest()
+        content = card_hash(info, None) + digest
+    else:
+        content = card_hash(info, photo)
+    return hashlib.sha256(f"{content}:{PREVIEW_VERSION}:{PREVIEW_SCALE}:{fmt}".encode()).hexdigest()
+
+def card_preview(info, photo=None, fmt=PREVIEW_FORMAT):
+    """Encoded preview image (WebP, or PNG without WebP support), cached by card content."""
+    key = preview_key(info, photo, fmt)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            metrics.count("card_previews_total", result="cached")
+            return _cache[key]
+
+    with metrics.timed("card_preview_seconds"):
+        output = io.BytesIO()
+        # Encoding costs more than drawing: fastest WebP method, lightest PNG compression
+        if fmt == "webp":
+            render_preview(info, photo).save(output, "WEBP", quality=85, method=0)
+        else:
+            render_preview(info, photo).save(output, "PNG", compress_level=1)
+        data = output.getvalue()
+    metrics.count("card_previews_total", result="rendered")
+
+    with _cache_lock:
+        _cache[key] = data
+        while len(_cache) > PREVIEW_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
@@ -0,0 +1,122 @@
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab.graphics.barcode import qrencoder
+from reportlab.lib.colors import black
+
+from config import QR_MODE
+
+
+# Compact payload, version 1. Positional fields separated by "*", upper-cased
+# and dates as YYYYMMDD so the whole payload stays in QR alphanumeric mode
+# (5.5 bits per character instead of 8); a CRC32 over the body ends it.
+#   IDC1*<roll>*<gr>*<name>*<father>*<dob>*<issue>*<expiry>*<phone>*<crc>
+# The "id" mode only carries the record id and roll number for lookup:
+#   IDR1*<id>*<roll>*<crc>
+# with an empty id for a record not saved yet (the Add Student preview).
+QR_LEVEL = "L"
+QR_BORDER = 4  # quiet zone, in modules
+_SEP = "*"
+_FULL_PREFIX = "IDC1"
+_ID_PREFIX = "IDR1"
+_FULL_FIELDS = [
+    "roll_no", "gr_number", "name", "father_name",
+    "date_of_birth", "date_of_issue", "date_of_expiry", "phone",
+]
+_DATE_FIELDS = {"date_of_birth", "date_of_issue", "date_of_expiry"}
+_LEGACY_LABELS = {
+    "Name": "name", "Father Name": "father_name", "Roll No": "roll_no", "GR NO": "gr_number",
+    "DOB": "date_of_birth", "Issue": "date_of_issue", "Expiry": "date_of_expiry", "Phone": "phone",
+}
+
+
+# ------------------ PAYLOAD ------------------
+def _checksum(body):
+    return f"{zlib.crc32(body.encode('utf-8')):08X}"
+
+def _field(info, field):
+    value = str(info.get(field) or "")
+    if field in _DATE_FIELDS and value:
+        value = datetime.fromisoformat(value).strftime("%Y%m%d")
+    return " ".join(value.replace(_SEP, " ").upper().split())
+
+def encode_payload(info, mode=QR_MODE):
+    if mode == "id":
+        student_id = info.get('id')
+        body = _SEP.join([_ID_PREFIX, "" if student_id is None else str(student_id), _field(info, 'roll_no')])
+    elif mode == "full":
+        body = _SEP.join([_FULL_PREFIX] + [_field(info, field) for field in _FULL_FIELDS])
+    else:
+        raise ValueError(f"Unknown QR mode: {mode}")
+    return f"{body}{_SEP}{_checksum(body)}"
+
+def decode_payload(text):
+    """Decode a scanned card QR into a dict of fields plus "mode".
+
+    Reads both compact modes and the free-text "Label: value" payload of
+    cards printed before them. Raises ValueError on a bad checksum or an
+    unrecognised payload."""
+    text = text.strip()
+    if text.startswith((_FULL_PREFIX + _SEP, _ID_PREFIX + _SEP)):
+        body, _, crc = text.rpartition(_SEP)
+        if crc != _checksum(body):
+            raise ValueError("QR checksum mismatch")
+        prefix, *values = body.split(_SEP)
+        if prefix == _ID_PREFIX:
+            if len(values) != 2:
+                raise ValueError("Malformed QR payload")
+            return {"mode": "id", "id": int(values[0]) if values[0] else None, "roll_no": values[1]}
+        if len(values) != len(_FULL_FIELDS):
+            raise ValueError("Malformed QR payload")
+        fields = dict(zip(_FULL_FIELDS, values))
+        for field in _DATE_FIELDS:
+            if fields[field]:
+                fields[field] = datetime.strptime(fields[field], "%Y%m%d").date().isoformat()
+        return {"mode": "full", **fields}
+
+    fields = {}
+    for line in text.splitlines():
+        label, _, value = line.partition(": ")
+        if label in _LEGACY_LABELS:
+            fields[_LEGACY_LABELS[label]] = value
+    if not fields:
+        raise ValueError("Not an ID card QR payload")
+    for field in _DATE_FIELDS & set(fields):
+        fields[field] = datetime.strptime(fields[field], "%d %B, %Y").date().isoformat()
+    return {"mode": "legacy", **fields}
+
+
+# ------------------ MATRIX ------------------
+@lru_cache(maxsize=4096)
+def qr_runs(payload):
+    """Encode once per payload (and so per card content); returns
+    (module_count, [(row, col, length), ...]) for each run of dark modules."""
+    code = qrencoder.QRCode(None, getattr(qrencoder.QRErrorCorrectLevel, QR_LEVEL))
+    code.addData(payload)
+    code.make()
+    runs = []
+    for r, row in enumerate(code.modules):
+        start = None
+        for col, dark in enumerate(row + [False]):
+            if dark and start is None:
+                start = col
+            elif not dark and start is not None:
+                runs.append((r, start, col - start))
+                start = None
+    return code.getModuleCount(), runs
+
+def draw_qr(c, payload, x, y, size):
+    """Draw the QR into a size x size square (quiet zone included) as one filled path."""
+    count, runs = qr_runs(payload)
+    module = size / (count + 2 * QR_BORDER)
+    top = y + size - QR_BORDER * module
+    left = x + QR_BORDER * module
+
+    c.saveState()
+    c.setFillColor(black)
+    path = c.beginPath()
+    for r, col, length in runs:
+        path.rect(left + col * module, top - (r + 1) * module, length * module, module)
+    c.drawPath(path, stroke=0, fill=1)
+    c.restoreState()
@@ -0,0 +1,207 @@
+import threading
+
+from search import SearchIndex
+import metrics
+
+
+_STALE = object()
+
+
+# ------------------ CACHED REPOSITORY ------------------
+class StudentRepository:
+    """Read-through cache over a storage backend.
+
+    The student list is parsed at most once per data version and shared by
+    every session, so the lists and dicts it hands out must be treated as
+    read-only. All writes go through here and invalidate the cache.
+
+    The search index is built from a snapshot and then patched in place by
+    this process's own writes; a change made elsewhere forces a rebuild."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._state = (_STALE, [], {}, {})
+        self._index_lock = threading.RLock()
+        self._index = (_STALE, None)
+
+    def _snapshot(self):
+        version = self.storage.data_version()
+        state = self._state
+        if state[0] == version:
+            return state
+        with self._lock:
+            state = self._state
+            if state[0] == version:
+                return state
+            metrics.count("repository_reloads_total")
+            with metrics.timed("storage_load_seconds", backend=type(self.storage).__name__):
+                data = self.storage.load_all()
+            by_roll = {}
+            for student in data:
+                by_roll.setdefault(student.get('roll_no'), student)
+            state = (version, data, {s.get('id'): s for s in data}, by_roll)
+            self._state = state
+            return state
+
+    def invalidate(self):
+        with self._lock:
+            self._state = (_STALE, [], {}, {})
+
+    @property
+    def version(self):
+        return self._snapshot()[0]
+
+    # Reads
+    def load_all(self):
+        return self._snapshot()[1]
+
+    def load_versioned(self):
+        """(version, students) taken from one snapshot."""
+        return self._snapshot()[:2]
+
+    def get(self, student_id):
+        return self._snapshot()[2].get(student_id)
+
+    def get_by_roll(self, roll_no):
+        return self._snapshot()[3].get(roll_no)
+
+    def roll_exists(self, roll_no):
+        return self.get_by_roll(roll_no) is not None
+
+    def get_by_rolls(self, roll_nos):
+        # Straight to the backend: batch imports must not force a full reload per batch
+        return self.storage.get_by_rolls(roll_nos)
+
+    def reserve_ids(self, count):
+        return self.storage.reserve_ids(count)
+
+    def changes_since(self, since=None):
+        """Delta since a sync token or datetime, straight from the backend's change index."""
+        with metrics.timed("storage_changes_seconds", backend=type(self.storage).__name__):
+            return self.storage.changes_since(since)
+
+    # Search
+    def _search_index(self):
+        with self._index_lock:
+            version, data = self._snapshot()[:2]
+            if self._index[0] != version:
+                with metrics.timed("search_index_build_seconds"):
+                    self._index = (version, SearchIndex(data))
+            return self._index[1]
+
+    def search(self, name=None, number=None, class_name=None):
+        """Matching students, best name matches first."""
+        with self._index_lock, metrics.timed("search_query_seconds"):
+            ids = self._search_index().search(name=name, number=number, class_name=class_name)
+        by_id = self._snapshot()[2]
+        return [by_id[sid] for sid in ids if sid in by_id]
+
+    def classes(self):
+        with self._index_lock:
+            return self._search_index().classes()
+
+    def _patch_index(self, previous_write, change):
+        # Apply our own write to the index only if the index was current just before
+        # it, as read under the write lock; a write from another process that landed
+        # in between (or no write at all) means a rebuild
+        written = self.storage.last_write()
+        with self._index_lock:
+            version, index = self._index
+            if index is None or written is previous_write or written[0] != version:
+                self._index = (_STALE, None)
+                return
+            change(index)
+            self._index = (written[1], index)
+
+    # Writes
+    def _timed_write(self, op):
+        return metrics.timed("storage_write_seconds", op=op, backend=type(self.storage).__name__)
+
+    def save_all(self, data, expected_version=None):
+        try:
+            with self._timed_write("save_all"):
+                self.storage.save_all(data, expected_version=expected_version)
+        finally:
+            self.invalidate()
+
+    def insert(self, student):
+        """Store a new student and return its id (also set on the record)."""
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("insert"):
+                student_id = self.storage.insert(student)
+        finally:
+            self.invalidate()
+        self._patch_index(before, lambda index: index.add(student))
+        return student_id
+
+    def upsert_many(self, students, expected_version=None):
+        students = list(students)
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("upsert_many"):
+                self.storage.upsert_many(students, expected_version=expected_version)
+        finally:
+            self.invalidate()
+
+        def apply(index):
+            for student in students:
+                index.update(student)
+        self._patch_index(before, apply)
+
+    def update(self, student_id, fields, expected=None):
+        """Update fields; with expected (the record as read), raise ConflictError
+        instead of overwriting a change made since."""
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("update"):
+                updated = self.storage.update(student_id, fields, expected=expected)
+        finally:
+            self.invalidate()
+        if updated:
+            self._patch_index(before, lambda index: index.update(self.storage.get(student_id)))
+        return updated
+
+    def delete(self, student_id):
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("delete"):
+                deleted = self.storage.delete(student_id)
+        finally:
+            self.invalidate()
+        if deleted:
+            self._patch_index(before, lambda index: index.remove(student_id))
+        return deleted
+
+    def update_many(self, updates):
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("update_many"):
+                changed = self.storage.update_many(updates)
+        finally:
+            self.invalidate()
+
+        def apply(index):
+            by_id = self._snapshot()[2]
+            for student_id in updates:
+                if student_id in by_id:
+                    index.update(by_id[student_id])
+        if changed:
+            self._patch_index(before, apply)
+        return changed
+
+    def delete_many(self, student_ids):
+        before = self.storage.last_write()
+        try:
+            with self._timed_write("delete_many"):
+                deleted = self.storage.delete_many(student_ids)
+        finally:
+            self.invalidate()
+
+        def apply(index):
+            for student in deleted:
+                index.remove(student.get('id'))
+        if deleted:
+            self._patch_index(before, apply)
+        return deleted
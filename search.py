@@ -0,0 +1,241 @@
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+from itertools import count
+
+
+_TOKEN_RE = re.compile(r"[^\w]+", re.UNICODE)
+_SEP = "\x00"  # joins roll/GR/phone so a substring never spans two fields
+
+
+def normalize(value):
+    return " ".join(_TOKEN_RE.split(str(value or "").lower())).strip()
+
+def _digits(value):
+    return "".join(ch for ch in str(value or "") if ch.isdigit())
+
+def _grams(text, n=3):
+    text = f" {text} "
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# ------------------ BUILDING BLOCKS ------------------
+class _PrefixIndex:
+    """Sorted (key, id) pairs; a prefix query is a bisect plus a short scan."""
+
+    def __init__(self):
+        self._pairs = []
+
+    def load(self, pairs):
+        # Bulk build: one sort instead of an insort per key
+        self._pairs = sorted(pair for pair in pairs if pair[0])
+
+    def add(self, key, student_id):
+        if key:
+            insort(self._pairs, (key, student_id))
+
+    def remove(self, key, student_id):
+        i = bisect_left(self._pairs, (key, student_id))
+        if i < len(self._pairs) and self._pairs[i] == (key, student_id):
+            del self._pairs[i]
+
+    def prefix(self, query):
+        found = set()
+        i = bisect_left(self._pairs, (query,))
+        while i < len(self._pairs) and self._pairs[i][0].startswith(query):
+            found.add(self._pairs[i][1])
+            i += 1
+        return found
+
+
+class _GramIndex:
+    """Trigram postings for substring checks and fuzzy ranking."""
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._values = {}
+
+    def add(self, value, student_id):
+        self._values[student_id] = value
+        for gram in _grams(value):
+            self._postings[gram].add(student_id)
+
+    def remove(self, student_id):
+        value = self._values.pop(student_id, None)
+        if value is None:
+            return
+        for gram in _grams(value):
+            postings = self._postings.get(gram)
+            if postings:
+                postings.discard(student_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def substring(self, query):
+        # Every trigram inside the query must occur in the value; confirm with `in`
+        inner = [query[i:i + 3] for i in range(len(query) - 2)]
+        if not inner:
+            # Shorter than a trigram: a plain scan, which is still cheap
+            return {sid for sid, value in self._values.items() if query in value}
+        candidates = set.intersection(*(self._postings.get(g, set()) for g in inner))
+        return {sid for sid in candidates if query in self._values[sid]}
+
+    def similar(self, query, threshold=0.5):
+        query_grams = _grams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for sid in self._postings.get(gram, ()):
+                shared[sid] += 1
+        scores = {}
+        for sid, hits in shared.items():
+            dice = 2 * hits / (len(query_grams) + len(_grams(self._values[sid])))
+            if dice >= threshold:
+                scores[sid] = dice
+        return scores
+
+
+# ------------------ STUDENT INDEX ------------------
+class SearchIndex:
+    """In-memory index over names, roll/GR/phone numbers and class.
+
+    Built once per data version and updated in place on add, edit and delete.
+    Name queries match token prefixes and substrings, falling back to ranked
+    trigram similarity for misspellings; number queries match prefixes and
+    substrings."""
+
+    def __init__(self, students=()):
+        self._keys = {}
+        self._order = {}  # id -> place in the roster, kept when the student is updated
+        self._positions = count()
+        self._name_tokens = _PrefixIndex()
+        self._vocabulary = _GramIndex()  # distinct name tokens, keyed by the token itself
+        self._token_ids = defaultdict(set)
+        self._number_prefix = _PrefixIndex()
+        self._numbers = _GramIndex()
+        self._by_class = defaultdict(set)
+
+        token_pairs, number_pairs = [], []
+        # A repeated id keeps its first place in the roster and its last record
+        latest = {student.get('id'): student for student in students}
+        for sid, student in latest.items():
+            self._order[sid] = next(self._positions)
+            name, numbers, class_name = self._keys[sid] = self._student_keys(student)
+            for token in set(name.split()):
+                token_pairs.append((token, sid))
+                self._add_token(token, sid)
+            number_pairs.extend((value, sid) for value in numbers)
+            self._numbers.add(_SEP.join(numbers), sid)
+            if class_name:
+                self._by_class[class_name].add(sid)
+        self._name_tokens.load(token_pairs)
+        self._number_prefix.load(number_pairs)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _student_keys(student):
+        numbers = (
+            normalize(student.get('roll_no')),
+            normalize(student.get('gr_number')),
+            _digits(student.get('phone')),
+        )
+        return normalize(student.get('name')), numbers, str(student.get('class') or "")
+
+    def add(self, student):
+        sid = student.get('id')
+        if sid in self._keys:
+            # An update keeps the student's place in the roster order
+            self._unindex(sid, self._keys[sid])
+        else:
+            self._order[sid] = next(self._positions)
+        name, numbers, class_name = self._keys[sid] = self._student_keys(student)
+        for token in set(name.split()):
+            self._name_tokens.add(token, sid)
+            self._add_token(token, sid)
+        for value in numbers:
+            self._number_prefix.add(value, sid)
+        self._numbers.add(_SEP.join(numbers), sid)
+        if class_name:
+            self._by_class[class_name].add(sid)
+
+    update = add
+
+    def remove(self, student_id):
+        keys = self._keys.pop(student_id, None)
+        if keys is None:
+            return
+        del self._order[student_id]
+        self._unindex(student_id, keys)
+
+    def _unindex(self, student_id, keys):
+        name, numbers, class_name = keys
+        for token in set(name.split()):
+            self._name_tokens.remove(token, student_id)
+            ids = self._token_ids[token]
+            ids.discard(student_id)
+            if not ids:
+                del self._token_ids[token]
+                self._vocabulary.remove(token)
+        for value in numbers:
+            self._number_prefix.remove(value, student_id)
+        self._numbers.remove(student_id)
+        if class_name:
+            self._by_class[class_name].discard(student_id)
+            if not self._by_class[class_name]:
+                del self._by_class[class_name]
+
+    def _add_token(self, token, student_id):
+        if token not in self._token_ids:
+            self._vocabulary.add(token, token)
+        self._token_ids[token].add(student_id)
+
+    def classes(self):
+        return sorted(self._by_class)
+
+    def _match_name(self, query, fuzzy):
+        # Every query token must match some name token: by prefix (best), inside
+        # the token, or, when neither finds anything, by trigram similarity
+        scores = None
+        for token in query.split():
+            matched = {}
+            for found in self._vocabulary.substring(token):
+                matched.update(dict.fromkeys(self._token_ids[found], 1.0))
+            matched.update(dict.fromkeys(self._name_tokens.prefix(token), 2.0))
+            if not matched and fuzzy:
+                for found, similarity in self._vocabulary.similar(token).items():
+                    for sid in self._token_ids[found]:
+                        matched[sid] = max(matched.get(sid, 0), similarity)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {sid: scores[sid] + score for sid, score in matched.items() if sid in scores}
+            if not scores:
+                return {}
+        return scores or {}
+
+    def _match_number(self, query):
+        digits = _digits(query)
+        found = self._number_prefix.prefix(query)
+        if digits and digits != query:
+            found |= self._number_prefix.prefix(digits)
+        found |= self._numbers.substring(query)
+        if digits and digits != query:
+            found |= self._numbers.substring(digits)
+        return found
+
+    def search(self, name=None, number=None, class_name=None, fuzzy=True):
+        """Return matching student ids, best name matches first, otherwise in roster order."""
+        candidates = None
+        scores = {}
+        if class_name:
+            candidates = set(self._by_class.get(str(class_name), ()))
+        if number and normalize(number):
+            found = self._match_number(normalize(number))
+            candidates = found if candidates is None else candidates & found
+        if name and normalize(name):
+            scores = self._match_name(normalize(name), fuzzy)
+            candidates = set(scores) if candidates is None else candidates & set(scores)
+        if candidates is None:
+            return list(self._keys)
+        return sorted(candidates, key=lambda sid: (-scores.get(sid, 0), self._order[sid]))
@@ -0,0 +1,1133 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from itertools import chain
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config import DATA_FILE, DB_FILE, JOURNAL_FILE, JOURNAL_COMPACT_ENTRIES, STORAGE_BACKEND
+import metrics
+
+
+STUDENT_FIELDS = [
+    "id", "name", "father_name", "roll_no", "class", "phone", "gr_number",
+    "date_of_birth", "date_of_issue", "date_of_expiry", "photo_path",
+    "created_at", "updated_at",
+]
+
+
+class ConflictError(Exception):
+    """A write was based on data that has changed since it was read."""
+
+
+# ------------------ LOCKING ------------------
+class FileLock:
+    """Exclusive lock on a side file, shared by every process using the store.
+
+    Reentrant within a thread. Each outermost acquisition opens its own
+    descriptor, so other threads of the same process are excluded too."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def __enter__(self):
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            f = open(self.path, "a+")
+            try:
+                with metrics.timed("storage_lock_wait_seconds"):
+                    if fcntl:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                f.close()
+                raise
+            self._local.file = f
+        self._local.depth = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            f = self._local.file
+            self._local.file = None
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            f.close()
+
+
+def _differs(current, expected):
+    return any(current.get(field) != expected.get(field) for field in STUDENT_FIELDS)
+
+def _drop_duplicate_ids(students):
+    # Old JSON files can hold duplicate ids (ids used to be len(data) + 1): the first
+    # record keeps its id, later ones are cleared so they get new ones from the sequence
+    seen = set()
+    for student in students:
+        if student.get('id') in seen:
+            student['id'] = None
+        seen.add(student.get('id'))
+
+def _needs_ids(students):
+    ids = [student.get('id') for student in students]
+    return None in ids or len(set(ids)) != len(ids)
+
+def _timestamp(moment=None):
+    # Fixed width, so stored times compare correctly as text
+    return (moment or datetime.now()).isoformat(timespec="microseconds")
+
+
+# ------------------ BASE BACKEND ------------------
+class StorageBackend:
+    """Student store. Subclasses must implement load_all/save_all; the rest
+    falls back to whole-list operations and can be overridden with indexed ones.
+
+    Records stored without an id are given the next one from a sequence that
+    never hands out an id twice, even after deletes; the id is set on the
+    record. Writes can be made conditional: expected_version (a data_version()
+    token) or expected (the record as it was read) raise ConflictError when
+    the data changed in between."""
+
+    # Whether changes_since() can return only what changed
+    tracks_changes = False
+
+    def __init__(self):
+        self._writes = threading.local()
+
+    def load_all(self):
+        raise NotImplementedError
+
+    def save_all(self, data, expected_version=None):
+        raise NotImplementedError
+
+    def data_version(self):
+        """Cheap token that changes whenever the stored data changes."""
+        raise NotImplementedError
+
+    def changes_since(self, since=None):
+        """Students added, changed or deleted after since: a sync token (the
+        "token" of an earlier result), a datetime, or None for everything.
+
+        Returns a dict with "token" (pass it next time), "students" (current
+        records), "deleted" (tombstones: id, roll_no, gr_number, deleted_at)
+        and "full". When full is True, "students" is the whole list and the
+        reader should replace its copy; without change tracking that is
+        always the case."""
+        return {"token": None, "full": True, "students": self.load_all(), "deleted": []}
+
+    def _write_lock(self):
+        # Held around every read-modify-write; backends with their own locking keep the no-op
+        return nullcontext()
+
+    def last_write(self):
+        """(data_version() just before, just after) this thread's latest write,
+        both read under the write lock, or None before the first write. A cache
+        built at the "before" version saw everything but that write."""
+        return getattr(self._writes, "versions", None)
+
+    def _check_version(self, expected_version):
+        if expected_version is not None and self.data_version() != expected_version:
+            raise ConflictError("Student data was changed by someone else. Reload and try again.")
+
+    def _read_sequence(self):
+        return 0
+
+    def _write_sequence(self, value):
+        pass
+
+    def reserve_ids(self, count, data=None):
+        """Reserve count consecutive new ids and return the first."""
+        with self._write_lock():
+            data = self.load_all() if data is None else data
+            first = max(self._read_sequence(), max((s.get('id') or 0 for s in data), default=0)) + 1
+            self._write_sequence(first + count - 1)
+            return first
+
+    def _assign_ids(self, data, students):
+        missing = [s for s in students if s.get('id') is None]
+        if missing:
+            first = self.reserve_ids(len(missing), data)
+            for i, student in enumerate(missing):
+                student['id'] = first + i
+
+    def get(self, student_id):
+        return next((s for s in self.load_all() if s.get('id') == student_id), None)
+
+    def get_by_roll(self, roll_no):
+        return next((s for s in self.load_all() if s.get('roll_no') == roll_no), None)
+
+    def roll_exists(self, roll_no):
+        return self.get_by_roll(roll_no) is not None
+
+    def get_by_rolls(self, roll_nos):
+        roll_nos = set(roll_nos)
+        found = {}
+        for student in self.load_all():
+            if student.get('roll_no') in roll_nos:
+                found.setdefault(student['roll_no'], student)
+        return found
+
+    def insert(self, student):
+        """Add one student; returns its id. Raises ConflictError if the roll number is taken."""
+        with self._write_lock():
+            data = self.load_all()
+            if any(s.get('roll_no') == student.get('roll_no') for s in data):
+                raise ConflictError(f"A student with roll number {student.get('roll_no')} already exists.")
+            self._assign_ids(data, [student])
+            data.append(student)
+            self.save_all(data)
+            return student['id']
+
+    def update(self, student_id, fields, expected=None):
+        with self._write_lock():
+            data = self.load_all()
+            for student in data:
+                if student.get('id') == student_id:
+                    if expected is not None and _differs(student, expected):
+                        raise ConflictError("This student was changed by someone else since you opened it.")
+                    student.update(fields)
+                    self.save_all(data)
+                    return True
+            if expected is not None:
+                raise ConflictError("This student was deleted by someone else.")
+            return False
+
+    def upsert_many(self, students, expected_version=None):
+        """Insert or replace students by id in one write."""
+        with self._write_lock():
+            self._check_version(expected_version)
+            data = self.load_all()
+            self._assign_ids(data, students)
+            index = {s.get('id'): i for i, s in enumerate(data)}
+            for student in students:
+                if student.get('id') in index:
+                    data[index[student['id']]] = student
+                else:
+                    index[student.get('id')] = len(data)
+                    data.append(student)
+            self.save_all(data)
+
+    def delete(self, student_id):
+        with self._write_lock():
+            data = self.load_all()
+            for i, student in enumerate(data):
+                if student.get('id') == student_id:
+                    data.pop(i)
+                    self.save_all(data)
+                    return student
+            return None
+
+    # Batch mutations: one load, one persist
+    def update_many(self, updates):
+        """Apply {student_id: fields} in one write; returns the number of students changed."""
+        with self._write_lock():
+            data = self.load_all()
+            changed = 0
+            for student in data:
+                fields = updates.get(student.get('id'))
+                if fields:
+                    student.update(fields)
+                    changed += 1
+            if changed:
+                self.save_all(data)
+            return changed
+
+    def delete_many(self, student_ids):
+        """Delete every listed student in one write; returns the deleted records."""
+        student_ids = set(student_ids)
+        with self._write_lock():
+            data = self.load_all()
+            kept = [s for s in data if s.get('id') not in student_ids]
+            deleted = [s for s in data if s.get('id') in student_ids]
+            if deleted:
+                self.save_all(kept)
+            return deleted
+
+
+# ------------------ JSON BACKEND ------------------
+class JsonStorage(StorageBackend):
+    """The whole list in one JSON file.
+
+    Writers take an exclusive lock on <file>.lock and replace the file
+    atomically, so readers never lock and never see a half-written file.
+    The id sequence is kept in <file>.seq."""
+
+    def __init__(self, path=DATA_FILE):
+        super().__init__()
+        self.path = path
+        self._lock = FileLock(f"{path}.lock")
+        self._sequence_path = f"{path}.seq"
+
+    def _write_lock(self):
+        return self._lock
+
+    def _read(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            # A journal snapshot wraps the list with the change it was compacted at
+            return data["students"] if isinstance(data, dict) else data
+        return []
+
+    def load_all(self):
+        data = self._read()
+        if _needs_ids(data):
+            # Renumber duplicate or missing ids once and save them, so every reader
+            # sees the same ids
+            with self._lock:
+                data = self._read()
+                if _needs_ids(data):
+                    self.save_all(data)
+        return data
+
+    def save_all(self, data, expected_version=None):
+        with self._lock:
+            before = self.data_version()
+            self._check_version(expected_version)
+            _drop_duplicate_ids(data)
+            self._assign_ids(data, data)
+            # Record the highest id ever stored before it can be deleted from the list
+            sequence = self._read_sequence()
+            highest = max([sequence] + [s['id'] for s in data if isinstance(s.get('id'), int)])
+            if highest > sequence:
+                self._write_sequence(highest)
+            self._replace(self.path, lambda f: json.dump(data, f, indent=4, default=str))
+            self._writes.versions = (before, self.data_version())
+
+    @staticmethod
+    def _replace(path, write):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_sequence(self):
+        try:
+            with open(self._sequence_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            # Files written before the sequence existed: start after the ids on disk
+            return max((s.get('id') or 0 for s in self._read()), default=0)
+
+    def _write_sequence(self, value):
+        self._replace(self._sequence_path, lambda f: f.write(str(value)))
+
+    def data_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Every save is a new file, so the inode changes even when size and mtime do not
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+# ------------------ JOURNAL BACKEND ------------------
+def _journal_generation(journal):
+    # The last change folded into the snapshot, from the "base" header a compaction
+    # writes as the first line; 0 for a journal that was never compacted
+    journal.seek(0)
+    line = journal.readline(4096)  # headers are short; a longer first line is a change
+    if line.endswith(b"\n"):
+        entry = json.loads(line)
+        if entry["op"] == "base":
+            return entry["seq"]
+    return 0
+
+
+class JournalStorage(StorageBackend):
+    """JSON snapshot plus an append-only journal of changes.
+
+    A write appends one compact line per changed student instead of rewriting
+    the snapshot, so its cost does not grow with the roster. The current list
+    is the snapshot with the journal replayed on top, and each process only
+    replays the lines appended since it last looked. Once the journal holds
+    compact_after changes, a background thread folds it into the snapshot and
+    moves the folded lines to <journal>.archive; together they form the
+    change feed read by changes().
+
+    A compaction stamps the snapshot and the new journal's header with the
+    last change it folded in. That generation, not the files' inode numbers
+    (which the filesystem reuses), tells a process that another one compacted.
+    Lines already in the snapshot are skipped, so a reader that catches a
+    compaction halfway (new snapshot, old journal) still sees the right list.
+    The snapshot is the JSON backend's file: compact before switching back."""
+
+    tracks_changes = True
+
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE, compact_after=JOURNAL_COMPACT_ENTRIES):
+        super().__init__()
+        self.path = path
+        self.journal_path = journal_path
+        self.archive_path = f"{journal_path}.archive"
+        self.compact_after = compact_after
+        self._lock = FileLock(f"{journal_path}.lock")
+        self._state_lock = threading.RLock()
+        self._generation = None  # journal generation the state was built from
+        self._offset = 0         # journal bytes already applied
+        self._students = {}
+        self._roll_counts = {}
+        self._seq = 0            # last change applied
+        self._base_seq = 0       # last change folded into the snapshot
+        self._base_ts = ""       # when that compaction ran
+        self._id_seq = 0         # highest id ever handed out
+        self._entries = 0        # changes in the live journal
+        self._compacting = False
+
+    def _write_lock(self):
+        return self._lock
+
+    # Replay
+    def _put(self, student):
+        self._remove(student['id'])
+        self._students[student['id']] = student
+        roll_no = student.get('roll_no')
+        self._roll_counts[roll_no] = self._roll_counts.get(roll_no, 0) + 1
+        if isinstance(student['id'], int):
+            self._id_seq = max(self._id_seq, student['id'])
+
+    def _remove(self, student_id):
+        student = self._students.pop(student_id, None)
+        if student is not None:
+            roll_no = student.get('roll_no')
+            self._roll_counts[roll_no] -= 1
+            if not self._roll_counts[roll_no]:
+                del self._roll_counts[roll_no]
+        return student
+
+    def _apply(self, entry):
+        op = entry["op"]
+        if op == "base":
+            self._base_seq = entry["seq"]
+            self._seq = max(self._seq, entry["seq"])
+            self._base_ts = entry["ts"]
+            self._id_seq = max(self._id_seq, entry["id_seq"])
+            return
+        self._seq = entry["seq"]
+        self._entries += 1
+        if op == "put":
+            self._put(entry["student"])
+        elif op == "patch":
+            current = self._students.get(entry["id"])
+            if current is not None:
+                # New dicts rather than in-place edits: earlier load_all() lists stay as they were
+                self._put({**current, **entry["fields"]})
+        elif op == "del":
+            self._remove(entry["id"])
+        elif op == "ids":
+            self._id_seq = max(self._id_seq, entry["value"])
+        elif op == "reset":
+            self._students, self._roll_counts = {}, {}
+            for student in entry["students"]:
+                self._put(student)
+
+    def _refresh(self):
+        with self._state_lock:
+            try:
+                journal = open(self.journal_path, "rb")
+            except FileNotFoundError:
+                journal = None
+            with journal or nullcontext():
+                generation = _journal_generation(journal) if journal else 0
+                if generation != self._generation:
+                    # First read, or another process compacted: start again from the snapshot
+                    self._students, self._roll_counts = {}, {}
+                    self._base_seq = self._entries = self._offset = 0
+                    self._base_ts = ""
+                    self._seq, self._id_seq, students = self._read_snapshot()
+                    for student in students:
+                        self._put(student)
+                    self._generation = generation
+                if journal is None:
+                    return
+                journal.seek(self._offset)
+                data = journal.read()
+            # A line still being written has no newline yet; it is picked up next time
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry["op"] == "base" or entry["seq"] > self._seq:
+                        self._apply(entry)
+            self._offset += end
+
+    def _read_snapshot(self):
+        # (last change folded in, highest id handed out, students); a plain list
+        # (an older snapshot, or one written by the JSON backend) is generation 0
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0, self._id_seq, []
+        if isinstance(data, list):
+            # Duplicate or missing ids get new ones after every id the JSON backend
+            # handed out, the same in every process; the next compaction stores them
+            _drop_duplicate_ids(data)
+            highest = max([self._id_seq, JsonStorage(self.path)._read_sequence()] + [
+                s['id'] for s in data if isinstance(s.get('id'), int)
+            ])
+            for student in data:
+                if student.get('id') is None:
+                    highest += 1
+                    student['id'] = highest
+            return 0, highest, data
+        return data["seq"], max(self._id_seq, data["id_seq"]), data["students"]
+
+    # Reads
+    def load_all(self):
+        with self._state_lock:
+            self._refresh()
+            return list(self._students.values())
+
+    def get(self, student_id):
+        with self._state_lock:
+            self._refresh()
+            return self._students.get(student_id)
+
+    def roll_exists(self, roll_no):
+        with self._state_lock:
+            self._refresh()
+            return roll_no in self._roll_counts
+
+    def data_version(self):
+        # Every compaction moves the generation on and the journal only grows in
+        # between, so a version never comes back
+        try:
+            with open(self.journal_path, "rb") as journal:
+                return (_journal_generation(journal), os.fstat(journal.fileno()).st_size)
+        except FileNotFoundError:
+            return (0, None)
+
+    @property
+    def last_seq(self):
+        """Sequence number of the latest change: a sync token for changes()."""
+        with self._state_lock:
+            self._refresh()
+            return self._seq
+
+    @staticmethod
+    def _entries_in(f):
+        for line in f:
+            # A line still being written has no newline yet
+            if line.endswith(b"\n") and line.strip():
+                yield json.loads(line)
+
+    def changes(self, since=0):
+        """Yield the changes made after sequence number since, oldest first.
+
+        Each is a dict with "seq", "ts" (ISO time) and "op": "put" (a whole
+        "student"), "patch" ("id" and changed "fields"), "del" ("id",
+        "roll_no", "gr_number"), "ids" (ids reserved up to "value") or "reset"
+        (the list was replaced by "students"). Reads <journal>.archive only
+        when since predates the last compaction."""
+        try:
+            journal = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+        with journal:
+            entries = self._entries_in(journal)
+            first = next(entries, None)
+            if first is None:
+                return
+            if first["op"] != "base":
+                entries = chain([first], entries)
+            elif since < first["seq"]:
+                # The open journal's header says what was archived before it, even if
+                # another process compacts while this is read
+                yield from self._archived(since, first["seq"])
+            for entry in entries:
+                if entry["seq"] > since:
+                    yield entry
+
+    def _archived(self, since, until):
+        last = since
+        try:
+            with open(self.archive_path, "rb") as archive:
+                for entry in self._entries_in(archive):
+                    # A compaction interrupted before replacing the journal archives its lines again
+                    if last < entry["seq"] <= until:
+                        last = entry["seq"]
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def changes_since(self, since=None):
+        with self._state_lock:
+            self._refresh()
+            token = self._seq
+            if isinstance(since, datetime):
+                after = _timestamp(since)
+                # Everything archived is older than the last compaction
+                start = self._base_seq if self._base_ts and after >= self._base_ts else 0
+            else:
+                after = None
+                start = since
+            full = since is None or (after is None and since > token)
+            touched, deleted = set(), {}
+            if not full:
+                for entry in self.changes(start):
+                    if entry["seq"] > token:
+                        break
+                    if after is not None and entry["ts"] <= after:
+                        continue
+                    op = entry["op"]
+                    if op == "reset":
+                        full = True
+                        break
+                    if op == "put":
+                        touched.add(entry["student"]["id"])
+                    elif op == "patch":
+                        touched.add(entry["id"])
+                    elif op == "del":
+                        deleted[entry["id"]] = entry
+            if full:
+                return {"token": token, "full": True, "students": list(self._students.values()), "deleted": []}
+            return {
+                "token": token,
+                "full": False,
+                "students": [self._students[i] for i in sorted(touched | set(deleted)) if i in self._students],
+                "deleted": [
+                    {"id": i, "roll_no": entry.get("roll_no"), "gr_number": entry.get("gr_number"), "deleted_at": entry["ts"]}
+                    for i, entry in sorted(deleted.items()) if i not in self._students
+                ],
+            }
+
+    # Writes
+    def _append(self, entries):
+        # Caller holds the file lock and has refreshed, so self._seq is the latest change
+        if not entries:
+            return
+        before = self.data_version()
+        now = _timestamp()
+        lines = []
+        for seq, entry in enumerate(entries, self._seq + 1):
+            lines.append(json.dumps({"seq": seq, "ts": now, **entry}, separators=(",", ":"), default=str))
+        with metrics.timed("journal_append_seconds"):
+            with open(self.journal_path, "ab") as f:
+                f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+        self._refresh()
+        self._writes.versions = (before, self.data_version())
+        if self._entries >= self.compact_after and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    @staticmethod
+    def _tombstone(student):
+        return {"op": "del", "id": student['id'], "roll_no": student.get('roll_no'), "gr_number": student.get('gr_number')}
+
+    def _assign_journal_ids(self, students):
+        for student in students:
+            if student.get('id') is None:
+                self._id_seq += 1
+                student['id'] = self._id_seq
+
+    def reserve_ids(self, count, data=None):
+        with self._lock:
+            self._refresh()
+            first = self._id_seq + 1
+            self._append([{"op": "ids", "value": first + count - 1}])
+            return first
+
+    def insert(self, student):
+        with self._lock:
+            self._refresh()
+            if student.get('roll_no') in self._roll_counts:
+                raise ConflictError(f"A student with roll number {student.get('roll_no')} already exists.")
+            self._assign_journal_ids([student])
+            self._append([{"op": "put", "student": student}])
+            return student['id']
+
+    def update(self, student_id, fields, expected=None):
+        with self._lock:
+            self._refresh()
+            current = self._students.get(student_id)
+            if current is None:
+                if expected is not None:
+                    raise ConflictError("This student was deleted by someone else.")
+                return False
+            if expected is not None and _differs(current, expected):
+                raise ConflictError("This student was changed by someone else since you opened it.")
+            self._append([{"op": "patch", "id": student_id, "fields": fields}])
+            return True
+
+    def upsert_many(self, students, expected_version=None):
+        with self._lock:
+            self._refresh()
+            self._check_version(expected_version)
+            self._assign_journal_ids(students)
+            self._append([{"op": "put", "student": student} for student in students])
+
+    def delete(self, student_id):
+        with self._lock:
+            self._refresh()
+            student = self._students.get(student_id)
+            if student is not None:
+                self._append([self._tombstone(student)])
+            return student
+
+    def update_many(self, updates):
+        with self._lock:
+            self._refresh()
+            entries = [
+                {"op": "patch", "id": student_id, "fields": fields}
+                for student_id, fields in updates.items() if fields and student_id in self._students
+            ]
+            self._append(entries)
+            return len(entries)
+
+    def delete_many(self, student_ids):
+        with self._lock:
+            self._refresh()
+            deleted = [self._students[i] for i in dict.fromkeys(student_ids) if i in self._students]
+            self._append([self._tombstone(student) for student in deleted])
+            return deleted
+
+    def save_all(self, data, expected_version=None):
+        # Logged as one "reset" entry first, so a crash before the compaction below
+        # still replays to the new list
+        with self._lock:
+            self._refresh()
+            self._check_version(expected_version)
+            _drop_duplicate_ids(data)
+            self._assign_journal_ids(data)
+            self._append([{"op": "reset", "students": data}])
+            self.compact()
+
+    # Compaction
+    def compact(self):
+        """Fold the journal into the snapshot and move its lines to the archive."""
+        with self._lock:
+            self._refresh()
+            if not self._entries:
+                return
+            with metrics.timed("journal_compact_seconds"):
+                with open(self.journal_path, "rb") as journal, open(self.archive_path, "ab") as archive:
+                    for line in journal:
+                        if line.endswith(b"\n") and json.loads(line)["op"] != "base":
+                            archive.write(line)
+                    archive.flush()
+                    os.fsync(archive.fileno())
+                # Snapshot first: until the journal is replaced, its lines are skipped as already folded in
+                snapshot = {"seq": self._seq, "id_seq": self._id_seq, "students": list(self._students.values())}
+                JsonStorage._replace(self.path, lambda f: json.dump(snapshot, f, indent=4, default=str))
+                header = {"seq": self._seq, "ts": _timestamp(), "op": "base", "id_seq": self._id_seq}
+                JsonStorage._replace(self.journal_path, lambda f: f.write(json.dumps(header) + "\n"))
+                self._generation = None
+                self._refresh()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+            metrics.count("journal_compactions_total", result="ok")
+        except Exception:
+            # The journal is still complete; the next write past the threshold tries again
+            metrics.count("journal_compactions_total", result="failed")
+        finally:
+            self._compacting = False
+
+
+# ------------------ SQLITE BACKEND ------------------
+_COLUMNS = ", ".join(f'"{field}"' for field in STUDENT_FIELDS)
+_PLACEHOLDERS = ", ".join("?" for _ in STUDENT_FIELDS)
+# Every write stamps its rows with the version it creates and the time
+_INSERT = f'INSERT INTO students ({_COLUMNS}, "change_seq", "modified_at") VALUES ({_PLACEHOLDERS}, ?, ?)'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    "id" INTEGER PRIMARY KEY,
+    "name" TEXT,
+    "father_name" TEXT,
+    "roll_no" TEXT NOT NULL,
+    "class" TEXT,
+    "phone" TEXT,
+    "gr_number" TEXT,
+    "date_of_birth" TEXT,
+    "date_of_issue" TEXT,
+    "date_of_expiry" TEXT,
+    "photo_path" TEXT,
+    "created_at" TEXT,
+    "updated_at" TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_students_roll_no ON students("roll_no");
+CREATE INDEX IF NOT EXISTS idx_students_class ON students("class");
+CREATE INDEX IF NOT EXISTS idx_students_expiry ON students("date_of_expiry");
+CREATE TABLE IF NOT EXISTS meta (
+    "key" TEXT PRIMARY KEY,
+    "value" TEXT
+);
+CREATE TABLE IF NOT EXISTS deleted_students (
+    "id" INTEGER PRIMARY KEY,
+    "roll_no" TEXT,
+    "gr_number" TEXT,
+    "change_seq" INTEGER NOT NULL,
+    "deleted_at" TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_change_seq ON deleted_students("change_seq");
+CREATE INDEX IF NOT EXISTS idx_deleted_at ON deleted_students("deleted_at");
+"""
+
+_CHANGE_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_students_change_seq ON students("change_seq");
+CREATE INDEX IF NOT EXISTS idx_students_modified_at ON students("modified_at");
+"""
+
+
+class SqliteStorage(StorageBackend):
+    tracks_changes = True
+
+    def __init__(self, path=DB_FILE):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+        if "change_seq" not in columns:
+            with self._transaction() as conn:
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+                if "change_seq" not in columns:
+                    # Rows from before change tracking count as changed at version 0, when last edited
+                    conn.execute('ALTER TABLE students ADD COLUMN "change_seq" INTEGER NOT NULL DEFAULT 0')
+                    conn.execute('ALTER TABLE students ADD COLUMN "modified_at" TEXT')
+                    conn.execute('UPDATE students SET "modified_at" = COALESCE("updated_at", "created_at")')
+        conn.executescript(_CHANGE_SCHEMA)
+
+    def _connect(self):
+        # Streamlit serves every session from its own thread, so keep one connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        return dict(row) if row is not None else None
+
+    @staticmethod
+    def _coerce(value):
+        if value is not None and not isinstance(value, (int, float, str)):
+            return str(value)
+        return value
+
+    def _values(self, student):
+        return [self._coerce(student.get(field)) for field in STUDENT_FIELDS]
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding SQLite's write lock from the start, so a
+        check and the write it guards see the same data. Readers are not
+        blocked (WAL)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = int(self.get_meta("version", 0, conn))
+            # Keep the id sequence at or above every id present before anything is deleted
+            conn.execute(
+                'INSERT INTO meta ("key", "value") SELECT \'id_seq\', COALESCE(MAX(id), 0) FROM students WHERE true '
+                'ON CONFLICT("key") DO UPDATE SET "value" = MAX(CAST("value" AS INTEGER), CAST(excluded."value" AS INTEGER))'
+            )
+            yield conn
+            after = int(self.get_meta("version", 0, conn))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        self._writes.versions = (before, after)
+
+    def _reserve(self, conn, count):
+        first = max(
+            int(self.get_meta("id_seq", 0, conn)),
+            conn.execute("SELECT COALESCE(MAX(id), 0) FROM students").fetchone()[0]
+        ) + 1
+        self.set_meta("id_seq", first + count - 1, conn)
+        return first
+
+    def reserve_ids(self, count, data=None):
+        with self._transaction() as conn:
+            return self._reserve(conn, count)
+
+    def _stamp(self, conn):
+        # (version this write creates, time): _bump_version() moves the counter to it
+        return int(self.get_meta("version", 0, conn)) + 1, _timestamp()
+
+    @staticmethod
+    def _bury(conn, rows, stamp):
+        conn.executemany(
+            'INSERT OR REPLACE INTO deleted_students ("id", "roll_no", "gr_number", "change_seq", "deleted_at") '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(row['id'], row['roll_no'], row['gr_number'], *stamp) for row in rows]
+        )
+
+    @staticmethod
+    def _unbury(conn, student_ids):
+        conn.executemany('DELETE FROM deleted_students WHERE "id" = ?', [(i,) for i in student_ids])
+
+    def _check_version(self, expected_version, conn=None):
+        if expected_version is not None and int(self.get_meta("version", 0, conn)) != expected_version:
+            raise ConflictError("Student data was changed by someone else. Reload and try again.")
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute(
+            'INSERT INTO meta ("key", "value") VALUES (\'version\', \'1\') '
+            'ON CONFLICT("key") DO UPDATE SET "value" = CAST("value" AS INTEGER) + 1'
+        )
+
+    def _insert_rows(self, conn, data, stamp):
+        # Old JSON files can hold duplicate ids (ids used to be len(data) + 1); those and
+        # missing ids get new ones from the sequence once the others are in
+        seen = set()
+        renumber = []
+        for student in data:
+            values = self._values(student)
+            if values[0] in seen or not isinstance(values[0], int):
+                renumber.append((student, values))
+                continue
+            conn.execute(_INSERT, values + list(stamp))
+            seen.add(values[0])
+        if renumber:
+            first = self._reserve(conn, len(renumber))
+            for i, (student, values) in enumerate(renumber):
+                student['id'] = values[0] = first + i
+                conn.execute(_INSERT, values + list(stamp))
+
+    def load_all(self):
+        rows = self._connect().execute(f"SELECT {_COLUMNS} FROM students ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def save_all(self, data, expected_version=None):
+        with self._transaction() as conn:
+            self._check_version(expected_version, conn)
+            stamp = self._stamp(conn)
+            kept = {student.get('id') for student in data}
+            old = conn.execute('SELECT "id", "roll_no", "gr_number" FROM students').fetchall()
+            self._bury(conn, [row for row in old if row['id'] not in kept], stamp)
+            conn.execute("DELETE FROM students")
+            self._insert_rows(conn, data, stamp)
+            conn.execute('DELETE FROM deleted_students WHERE "id" IN (SELECT "id" FROM students)')
+            self._bump_version(conn)
+
+    def data_version(self):
+        return int(self.get_meta("version", 0))
+
+    def changes_since(self, since=None):
+        conn = self._connect()
+        # One read transaction: the rows, tombstones and token come from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            token = int(self.get_meta("version", 0, conn))
+            if isinstance(since, datetime):
+                full = False
+                students_where, deleted_where, value = '"modified_at" > ?', '"deleted_at" > ?', _timestamp(since)
+            else:
+                # A token newer than the database means it came from a database since replaced
+                full = since is None or since > token
+                students_where, deleted_where, value = '"change_seq" > ?', '"change_seq" > ?', since
+            if full:
+                return {"token": token, "full": True, "students": self.load_all(), "deleted": []}
+            students = conn.execute(
+                f"SELECT {_COLUMNS} FROM students WHERE {students_where} ORDER BY id", (value,)
+            ).fetchall()
+            deleted = conn.execute(
+                f'SELECT "id", "roll_no", "gr_number", "deleted_at" FROM deleted_students WHERE {deleted_where} ORDER BY id',
+                (value,)
+            ).fetchall()
+        finally:
+            conn.commit()
+        return {
+            "token": token,
+            "full": False,
+            "students": [dict(row) for row in students],
+            "deleted": [dict(row) for row in deleted],
+        }
+
+    def get(self, student_id):
+        row = self._connect().execute(f"SELECT {_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+        return self._to_dict(row)
+
+    def get_by_roll(self, roll_no):
+        row = self._connect().execute(
+            f"SELECT {_COLUMNS} FROM students WHERE roll_no = ? LIMIT 1", (str(roll_no),)
+        ).fetchone()
+        return self._to_dict(row)
+
+    def get_by_rolls(self, roll_nos):
+        roll_nos = [str(r) for r in set(roll_nos)]
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(roll_nos), 500):
+            chunk = roll_nos[start:start + 500]
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM students WHERE roll_no IN ({', '.join('?' for _ in chunk)}) ORDER BY id",
+                chunk
+            ).fetchall()
+            for row in rows:
+                found.setdefault(row['roll_no'], dict(row))
+        return found
+
+    def insert(self, student):
+        with self._transaction() as conn:
+            taken = conn.execute(
+                "SELECT 1 FROM students WHERE roll_no = ? LIMIT 1", (self._coerce(student.get('roll_no')),)
+            ).fetchone()
+            if taken:
+                raise ConflictError(f"A student with roll number {student.get('roll_no')} already exists.")
+            if student.get('id') is None:
+                student['id'] = self._reserve(conn, 1)
+            conn.execute(_INSERT, self._values(student) + list(self._stamp(conn)))
+            self._unbury(conn, [student['id']])
+            self._bump_version(conn)
+        return student['id']
+
+    def upsert_many(self, students, expected_version=None):
+        updates = ", ".join(f'"{f}" = excluded."{f}"' for f in STUDENT_FIELDS + ["change_seq", "modified_at"] if f != "id")
+        with self._transaction() as conn:
+            self._check_version(expected_version, conn)
+            missing = [s for s in students if s.get('id') is None]
+            if missing:
+                first = self._reserve(conn, len(missing))
+                for i, student in enumerate(missing):
+                    student['id'] = first + i
+            stamp = list(self._stamp(conn))
+            conn.executemany(
+                f"{_INSERT} ON CONFLICT(id) DO UPDATE SET {updates}",
+                [self._values(student) + stamp for student in students]
+            )
+            self._unbury(conn, [student['id'] for student in students])
+            self._bump_version(conn)
+
+    def update(self, student_id, fields, expected=None):
+        fields = {k: v for k, v in fields.items() if k in STUDENT_FIELDS and k != "id"}
+        if not fields and expected is None:
+            return self.get(student_id) is not None
+        assignments = ", ".join(f'"{k}" = ?' for k in fields)
+        values = [self._coerce(v) for v in fields.values()]
+        with self._transaction() as conn:
+            if expected is not None:
+                row = conn.execute(f"SELECT {_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+                if row is None:
+                    raise ConflictError("This student was deleted by someone else.")
+                if _differs(dict(row), expected):
+                    raise ConflictError("This student was changed by someone else since you opened it.")
+                if not fields:
+                    return True
+            cur = conn.execute(
+                f'UPDATE students SET {assignments}, "change_seq" = ?, "modified_at" = ? WHERE id = ?',
+                values + list(self._stamp(conn)) + [student_id]
+            )
+            self._bump_version(conn)
+        return cur.rowcount > 0
+
+    def delete(self, student_id):
+        with self._transaction() as conn:
+            row = conn.execute(f"SELECT {_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
+            self._bury(conn, [row], self._stamp(conn))
+            self._bump_version(conn)
+        return dict(row)
+
+    def update_many(self, updates):
+        changed = 0
+        with self._transaction() as conn:
+            stamp = list(self._stamp(conn))
+            for student_id, fields in updates.items():
+                fields = {k: v for k, v in fields.items() if k in STUDENT_FIELDS and k != "id"}
+                if not fields:
+                    continue
+                assignments = ", ".join(f'"{k}" = ?' for k in fields)
+                values = [self._coerce(v) for v in fields.values()]
+                cur = conn.execute(
+                    f'UPDATE students SET {assignments}, "change_seq" = ?, "modified_at" = ? WHERE id = ?',
+                    values + stamp + [student_id]
+                )
+                changed += cur.rowcount
+            if changed:
+                self._bump_version(conn)
+        return changed
+
+    def delete_many(self, student_ids):
+        student_ids = list(set(student_ids))
+        deleted = []
+        with self._transaction() as conn:
+            stamp = self._stamp(conn)
+            for start in range(0, len(student_ids), 500):
+                chunk = student_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT {_COLUMNS} FROM students WHERE id IN ({placeholders}) ORDER BY id", chunk
+                ).fetchall()
+                conn.execute(f"DELETE FROM students WHERE id IN ({placeholders})", chunk)
+                self._bury(conn, rows, stamp)
+                deleted.extend(dict(row) for row in rows)
+            if deleted:
+                self._bump_version(conn)
+        return deleted
+
+    def get_meta(self, key, default=None, conn=None):
+        row = (conn or self._connect()).execute('SELECT "value" FROM meta WHERE "key" = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value, conn=None):
+        (conn or self._connect()).execute(
+            'INSERT OR REPLACE INTO meta ("key", "value") VALUES (?, ?)', (key, str(value))
+        )
+
+
+# ------------------ MIGRATION ------------------
+def migrate_json_to_sqlite(storage, json_path=DATA_FILE):
+    """Copy the legacy JSON file into an empty SQLite store, once."""
+    if storage.get_meta("migrated_from_json"):
+        return 0
+    data = JsonStorage(json_path).load_all() if os.path.exists(json_path) else []
+    with storage._transaction() as conn:
+        if conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 0:
+            storage._insert_rows(conn, data, storage._stamp(conn))
+            storage._bump_version(conn)
+        else:
+            data = []
+        storage.set_meta("migrated_from_json", json_path, conn)
+    return len(data)
+
+
+def get_storage(backend=STORAGE_BACKEND):
+    if backend == "json":
+        return JsonStorage(DATA_FILE)
+    if backend == "journal":
+        return JournalStorage(DATA_FILE, JOURNAL_FILE)
+    if backend == "sqlite":
+        storage = SqliteStorage(DB_FILE)
+        migrate_json_to_sqlite(storage, DATA_FILE)
+        return storage
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,97 @@
+"""Synthetic schools for benchmarks and local testing.
+
+    python synthetic.py --students 5000 --output school.csv
+"""
+import argparse
+import os
+import random
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from PIL import Image, ImageDraw, ImageFilter
+
+from importer import REQUIRED_COLUMNS
+
+
+FIRST_NAMES = [
+    "Muhammad", "Ahmed", "Ali", "Hassan", "Hussain", "Usman", "Bilal", "Hamza", "Umar", "Zain",
+    "Abdullah", "Ibrahim", "Saad", "Taha", "Rayan", "Arham", "Fatima", "Ayesha", "Zainab", "Maryam",
+    "Khadija", "Sara", "Hira", "Amna", "Iqra", "Mahnoor", "Laiba", "Noor", "Hafsa", "Areeba",
+]
+LAST_NAMES = [
+    "Khan", "Ahmed", "Ali", "Shah", "Qureshi", "Siddiqui", "Malik", "Butt", "Sheikh", "Raza",
+    "Iqbal", "Chaudhry", "Hashmi", "Javed", "Mirza", "Abbasi", "Ansari", "Baig", "Rana", "Zaidi",
+]
+CLASSES = [str(n) for n in range(1, 11)]
+
+
+# ------------------ STUDENTS ------------------
+def make_students(count, seed=0, photo_paths=None, start_id=1):
+    """Return count student records shaped like the app's own, with a realistic
+    spread of names, classes, ages and issue dates. Photos, if given, are
+    assigned round-robin."""
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.now().isoformat()
+    students = []
+    for i in range(count):
+        student_class = rng.choice(CLASSES)
+        last_name = rng.choice(LAST_NAMES)
+        issued = today - timedelta(days=rng.randint(0, 700))
+        born = date(today.year - 5 - int(student_class), rng.randint(1, 12), rng.randint(1, 28))
+        students.append({
+            'id': start_id + i,
+            'name': f"{rng.choice(FIRST_NAMES)} {last_name}",
+            'father_name': f"{rng.choice(FIRST_NAMES[:16])} {last_name}",
+            'roll_no': f"R-{start_id + i:06d}",
+            'class': student_class,
+            'phone': f"03{rng.randint(0, 49):02d}{rng.randint(0, 9999999):07d}",
+            'gr_number': f"GR{10000 + start_id + i}",
+            'date_of_birth': born.isoformat(),
+            'date_of_issue': issued.isoformat(),
+            'date_of_expiry': (issued + timedelta(days=730)).isoformat(),
+            'photo_path': photo_paths[i % len(photo_paths)] if photo_paths else None,
+            'created_at': now,
+        })
+    return students
+
+def to_frame(students):
+    """Import-sheet view of the students: the columns the importer requires."""
+    return pd.DataFrame([{col: s.get(col) for col in REQUIRED_COLUMNS} for s in students], columns=REQUIRED_COLUMNS)
+
+
+# ------------------ PHOTOS ------------------
+def make_photos(directory, count, size_px=1200, seed=0):
+    """Write count camera-like JPEG portraits of size_px x (4/3 size_px) and return their paths."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    width, height = size_px, size_px * 4 // 3
+    paths = []
+    for i in range(count):
+        img = Image.new("RGB", (width, height), tuple(rng.randint(90, 230) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        skin = tuple(rng.randint(150, 230) for _ in range(3))
+        draw.ellipse((width * 0.3, height * 0.18, width * 0.7, height * 0.58), fill=skin)
+        draw.rectangle((width * 0.15, height * 0.62, width * 0.85, height), fill=tuple(rng.randint(0, 120) for _ in range(3)))
+        # Sensor-like noise so JPEG sizes resemble real photos rather than flat fills
+        noise = Image.effect_noise((width, height), rng.randint(20, 40)).convert("RGB")
+        img = Image.blend(img, noise, 0.15).filter(ImageFilter.SMOOTH)
+        path = os.path.join(directory, f"synthetic_{i:04d}.jpg")
+        img.save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic school as an import sheet.")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic_school.csv", help=".csv or .xlsx")
+    args = parser.parse_args()
+
+    df = to_frame(make_students(args.students, seed=args.seed))
+    if args.output.endswith(".xlsx"):
+        df.to_excel(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} students to {args.output}")
@@ -0,0 +1,71 @@
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JournalStorage
+
+
+WRITERS = 4
+INSERTS = 30
+COMPACT_AFTER = 20
+
+
+def _insert_students(path, journal_path, writer):
+    store = JournalStorage(path, journal_path, compact_after=COMPACT_AFTER)
+    for i in range(INSERTS):
+        store.insert({"id": None, "name": f"Student {writer}-{i}", "roll_no": f"{writer}-{i}"})
+    store.compact()
+
+
+@pytest.mark.parametrize("run", range(5))
+def test_concurrent_inserts_survive_compaction(tmp_path, run):
+    # Every writer compacts repeatedly while the others append; a process that
+    # misses another's compaction must not hand out ids twice or misread the journal
+    path, journal_path = str(tmp_path / "students.json"), str(tmp_path / "students.journal")
+    context = multiprocessing.get_context("spawn")
+    writers = [
+        context.Process(target=_insert_students, args=(path, journal_path, writer))
+        for writer in range(WRITERS)
+    ]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(120)
+    assert [process.exitcode for process in writers] == [0] * WRITERS
+
+    students = JournalStorage(path, journal_path).load_all()
+    assert len(students) == WRITERS * INSERTS
+    assert len({s["id"] for s in students}) == WRITERS * INSERTS
+    assert {s["roll_no"] for s in students} == {f"{w}-{i}" for w in range(WRITERS) for i in range(INSERTS)}
+
+
+def test_data_version_changes_on_every_compaction(tmp_path):
+    store = JournalStorage(str(tmp_path / "students.json"), str(tmp_path / "students.journal"), compact_after=10 ** 6)
+    seen = {store.data_version()}
+    for i in range(20):
+        store.insert({"id": None, "name": f"Student {i}", "roll_no": str(i)})
+        store.compact()
+        assert store.data_version() not in seen
+        seen.add(store.data_version())
+
+
+def test_legacy_snapshot_duplicate_ids_are_renumbered(tmp_path):
+    # Ids used to be len(data) + 1, so old files repeat them after a delete
+    path, journal_path = str(tmp_path / "students.json"), str(tmp_path / "students.journal")
+    with open(path, "w") as f:
+        json.dump([{"id": 1, "name": "A"}, {"id": 2, "name": "B"}, {"id": 2, "name": "C"}, {"id": None, "name": "D"}], f)
+
+    store = JournalStorage(path, journal_path)
+    students = {s["name"]: s["id"] for s in store.load_all()}
+    assert students == {"A": 1, "B": 2, "C": 3, "D": 4}
+    assert JournalStorage(path, journal_path).load_all() == store.load_all()
+
+    store.insert({"id": None, "name": "E", "roll_no": "5"})
+    store.compact()
+    students = {s["name"]: s["id"] for s in JournalStorage(path, journal_path).load_all()}
+    assert students == {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5}
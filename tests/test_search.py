@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository import StudentRepository
+from search import SearchIndex
+from storage import JsonStorage
+
+
+STUDENTS = [
+    {"id": 1, "name": "Muhammad Ali", "roll_no": "45", "gr_number": "2012", "phone": "0300", "class": "5"},
+    {"id": 2, "name": "Sara Khan", "roll_no": "R-012", "gr_number": "7", "phone": "", "class": "5"},
+    {"id": 10, "name": "Bilal Ahmed", "roll_no": "3", "gr_number": "8", "phone": "", "class": "5"},
+]
+
+
+def test_short_queries_match_substrings():
+    index = SearchIndex(STUDENTS)
+    assert index.search(number="5") == [1]
+    assert index.search(number="12") == [1, 2]
+    assert index.search(name="li") == [1]
+    assert index.search(name="al") == [1, 10]
+
+
+def test_ties_and_updates_keep_roster_order():
+    index = SearchIndex(STUDENTS)
+    assert index.search(class_name="5") == [1, 2, 10]
+    index.update({**STUDENTS[0], "name": "Muhammad Umar"})
+    assert index.search() == [1, 2, 10]
+
+
+def test_repeated_id_indexes_only_the_last_record():
+    index = SearchIndex(STUDENTS + [{"id": 1, "name": "Zara Q", "roll_no": "9"}])
+    assert index.search(name="muhammad") == []
+    assert index.search(name="zara") == [1]
+
+
+def test_json_duplicate_ids_are_renumbered_and_listed(tmp_path):
+    path = str(tmp_path / "students.json")
+    with open(path, "w") as f:
+        json.dump([{"id": 1, "name": "A"}, {"id": 2, "name": "B"}, {"id": 2, "name": "C"}], f)
+
+    store = StudentRepository(JsonStorage(path))
+    assert [(s["id"], s["name"]) for s in store.load_all()] == [(1, "A"), (2, "B"), (3, "C")]
+    assert [s["name"] for s in store.search()] == ["A", "B", "C"]
+    assert [s["name"] for s in store.search(name="b")] == ["B"]
+    # Saved once, so a second process reads the same ids
+    assert [s["id"] for s in JsonStorage(path).load_all()] == [1, 2, 3]